@@ -1,17 +1,22 @@
 import enum
 import pathlib
+import typing
 
 class Layout(enum.IntEnum):
   BASIC = 0
   RAQM = 1
 
 class FreeTypeFont:
+  path: str | pathlib.Path | typing.BinaryIO
+  size: int
+  index: int
+
   def getmetrics(self) -> tuple[int, int]: ...
 
 class ImageFont: ...
 
 def truetype(
-  font: pathlib.Path | None = None,
+  font: pathlib.Path | typing.BinaryIO | None = None,
   size: int = 10,
   index: int = 0,
   encoding: str = '',
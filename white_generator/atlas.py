@@ -0,0 +1,84 @@
+import math
+import json
+
+from PIL import Image
+
+from . import types
+
+class Atlas:
+    def __init__(self, atlas_parameters: types.AtlasParameters) -> None:
+        self.atlas_parameters = atlas_parameters
+
+        self._images: list[tuple[str, Image.Image]] = []
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self._images) >= self.atlas_parameters.note_count
+
+    @property
+    def note_ids(self) -> list[str]:
+        return [note_id for note_id, _ in self._images]
+
+    def add(self, note_id: str, image: Image.Image) -> None:
+        if self._images and image.size != self._images[0][1].size:
+            raise ValueError(
+                f'the image size {image.size} differs '
+                    + f'from the atlas cell size {self._images[0][1].size}',
+            )
+
+        self._images.append((note_id, image))
+
+    def build(self) -> tuple[Image.Image, dict[str, dict[str, int]]]:
+        if not self._images:
+            raise ValueError('the atlas is empty')
+
+        (_, first_image) = self._images[0]
+        (cell_width, cell_height) = first_image.size
+        column_count = self._get_column_count()
+        row_count = math.ceil(len(self._images) / column_count)
+
+        atlas_image = Image.new(
+            first_image.mode,
+            (column_count * cell_width, row_count * cell_height),
+        )
+        index = {}
+        for image_number, (note_id, image) in enumerate(self._images):
+            (row, column) = divmod(image_number, column_count)
+            (left, top) = (column * cell_width, row * cell_height)
+            atlas_image.paste(image, (left, top))
+            index[note_id] = {
+                'left': left,
+                'top': top,
+                'width': cell_width,
+                'height': cell_height,
+            }
+
+        return (atlas_image, index)
+
+    def clear(self) -> None:
+        # the images are freed at once instead of waiting for the next ones
+        for _, image in self._images:
+            image.close()
+
+        self._images = []
+
+    def _get_column_count(self) -> int:
+        if self.atlas_parameters.columns is not None:
+            return min(self.atlas_parameters.columns, len(self._images))
+
+        # the atlas is kept close to a square by default
+        return math.ceil(math.sqrt(len(self._images)))
+
+def encode_index(
+    image_filename: str,
+    image_size: tuple[int, int],
+    index: dict[str, dict[str, int]],
+) -> bytes:
+    (width, height) = image_size
+    return json.dumps(
+        {'image': image_filename, 'width': width, 'height': height, 'notes': index},
+        indent=2,
+    ).encode()
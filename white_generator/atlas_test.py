@@ -0,0 +1,76 @@
+import unittest
+import json
+
+from PIL import Image
+
+from . import types
+from . import atlas
+
+class TestAtlas(unittest.TestCase):
+  def test_build(self) -> None:
+    note_atlas = atlas.Atlas(types.AtlasParameters(note_count=3))
+    for note_number, color in enumerate(['red', 'green', 'blue']):
+      note_atlas.add(f'note-{note_number}', Image.new('RGB', (10, 20), color))
+
+    (atlas_image, index) = note_atlas.build()
+
+    self.assertTrue(note_atlas.is_full)
+    self.assertEqual(note_atlas.note_ids, ['note-0', 'note-1', 'note-2'])
+    self.assertEqual(atlas_image.size, (20, 40))
+    self.assertEqual(index, {
+      'note-0': {'left': 0, 'top': 0, 'width': 10, 'height': 20},
+      'note-1': {'left': 10, 'top': 0, 'width': 10, 'height': 20},
+      'note-2': {'left': 0, 'top': 20, 'width': 10, 'height': 20},
+    })
+    self.assertEqual(atlas_image.getpixel((5, 10)), (255, 0, 0))
+    self.assertEqual(atlas_image.getpixel((15, 10)), (0, 128, 0))
+    self.assertEqual(atlas_image.getpixel((5, 30)), (0, 0, 255))
+    self.assertEqual(atlas_image.getpixel((15, 30)), (0, 0, 0))
+
+  def test_build_with_columns(self) -> None:
+    note_atlas = atlas.Atlas(types.AtlasParameters(note_count=4, columns=3))
+    for note_number in range(2):
+      note_atlas.add(f'note-{note_number}', Image.new('RGB', (10, 20)))
+
+    (atlas_image, _) = note_atlas.build()
+
+    self.assertFalse(note_atlas.is_full)
+    self.assertEqual(atlas_image.size, (20, 20))
+
+  def test_build_empty(self) -> None:
+    note_atlas = atlas.Atlas(types.AtlasParameters(note_count=4))
+
+    with self.assertRaises(ValueError):
+      note_atlas.build()
+
+  def test_add_with_different_size(self) -> None:
+    note_atlas = atlas.Atlas(types.AtlasParameters(note_count=4))
+    note_atlas.add('note-0', Image.new('RGB', (10, 20)))
+
+    with self.assertRaises(ValueError):
+      note_atlas.add('note-1', Image.new('RGB', (20, 10)))
+
+  def test_clear(self) -> None:
+    note_atlas = atlas.Atlas(types.AtlasParameters(note_count=1))
+    image = Image.new('RGB', (10, 20))
+    note_atlas.add('note-0', image)
+
+    note_atlas.clear()
+
+    self.assertEqual(len(note_atlas), 0)
+    self.assertFalse(note_atlas.is_full)
+    with self.assertRaises(ValueError):
+      image.load()
+
+class TestEncodeIndex(unittest.TestCase):
+  def test_encode_index(self) -> None:
+    index = {'note-0': {'left': 0, 'top': 0, 'width': 10, 'height': 20}}
+
+    data = atlas.encode_index('atlas.png', (10, 20), index)
+
+    self.assertEqual(json.loads(data), {
+      'image': 'atlas.png',
+      'width': 10,
+      'height': 20,
+      'notes': index,
+    })
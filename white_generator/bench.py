@@ -0,0 +1,279 @@
+import argparse
+import importlib.metadata
+import json
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import typing
+
+from . import __version__
+from . import cli
+from . import io
+from . import db
+from . import text
+from . import types
+from . import generation
+from . import writing
+from . import profiling
+
+DEFAULT_REPEATS = 5
+DEFAULT_NOTE_COUNT = 1000
+DEFAULT_DB_ROW_COUNTS = (10_000, 100_000, 300_000)
+
+_LONG_NOTE_REPEATS = 4
+_MANY_LINE_NOTE_REPEATS = 5
+_SHORT_NOTE_WORD_COUNT = 8
+_DB_PROBE_COUNT = 10_000
+_RENDERING_STAGES = (
+    'rectangle_fitting',
+    'wrapping',
+    'drawing',
+    'encoding',
+    'saving',
+)
+
+_Stage: typing.TypeAlias = typing.Callable[[], object]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog=__package__.replace('_', '-') + '-bench',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '-r',
+        '--resources-path',
+        type=pathlib.Path,
+        required=True,
+        help='the path to the notes, font and background resources',
+    )
+    parser.add_argument(
+        '-n',
+        '--repeats',
+        type=cli.parse_positive_integer,
+        default=DEFAULT_REPEATS,
+        help='the number of runs of each stage',
+    )
+    parser.add_argument(
+        '-N',
+        '--note-count',
+        type=cli.parse_positive_integer,
+        default=DEFAULT_NOTE_COUNT,
+        help='the number of notes for the reading and deduplication stages',
+    )
+    parser.add_argument(
+        '-d',
+        '--db-row-counts',
+        type=cli.parse_positive_integer,
+        nargs='+',
+        default=DEFAULT_DB_ROW_COUNTS,
+        help='the numbers of notes in the database for the probe latency',
+    )
+    parser.add_argument(
+        '-o',
+        '--output-file',
+        type=pathlib.Path,
+        help='the path to the JSON file with results (if none, stdout is used)',
+    )
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(
+        arguments.resources_path,
+        arguments.repeats,
+        arguments.note_count,
+        arguments.db_row_counts,
+    )
+    if arguments.output_file is None:
+        json.dump(results, sys.stdout, indent=2)
+        print('')
+    else:
+        with open(arguments.output_file, mode='w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+def run_benchmarks(
+    resources_path: pathlib.Path,
+    repeats: int,
+    note_count: int,
+    db_row_counts: typing.Iterable[int] = DEFAULT_DB_ROW_COUNTS,
+) -> dict[str, typing.Any]:
+    image_parameters = types.ImageParameters(
+        background_image=resources_path / 'background' / 'clouds.jpg',
+    )
+    text_parameters = types.TextParameters(
+        font=types.FontParameters(
+            file=resources_path / 'font' / 'Kalam-Regular.ttf',
+        ),
+    )
+
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    notes = _get_benchmark_notes(resources_path / 'notes.txt')
+    with tempfile.TemporaryDirectory(prefix='white-generator-') as tmp_dir:
+        tmp_path = pathlib.Path(tmp_dir)
+        for case_name, note in notes.items():
+            notes_file = tmp_path / f'{case_name}.txt'
+            notes_file.write_text(
+                '\n\n'.join(f'{note} #{index}' for index in range(note_count)),
+            )
+            read_notes = list(io.read_notes(notes_file))
+
+            results[case_name] = {
+                'reading': _get_statistics(_measure_stage(
+                    lambda: list(io.read_notes(notes_file)),
+                    repeats,
+                )),
+                'dedup': _get_statistics(
+                    _measure_deduplication(read_notes, tmp_path, repeats),
+                ),
+            }
+            # the rendering stages are measured by the profiler
+            # of the renderer itself
+            stage_times = _measure_rendering(
+                note,
+                image_parameters,
+                text_parameters,
+                tmp_path / f'{case_name}.png',
+                repeats,
+            )
+            for stage_name in _RENDERING_STAGES:
+                results[case_name][stage_name] = \
+                    _get_statistics(stage_times[stage_name])
+
+        db_probe_results = _measure_db_probes(
+            notes['long'],
+            tmp_path / 'probes.db',
+            db_row_counts,
+        )
+
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'pillow': importlib.metadata.version('pillow'),
+        'repeats': repeats,
+        'note_count': note_count,
+        'results': results,
+        'db_probe': db_probe_results,
+    }
+
+def _get_benchmark_notes(notes_filename: pathlib.Path) -> dict[str, str]:
+    (single_line_note, multiline_note, *_) = io.read_notes(notes_filename)
+    return {
+        'short': ' '.join(single_line_note.split(' ')[:_SHORT_NOTE_WORD_COUNT]),
+        'long': ' '.join([single_line_note] * _LONG_NOTE_REPEATS),
+        'many_lines': '\n'.join([multiline_note] * _MANY_LINE_NOTE_REPEATS),
+    }
+
+def _measure_deduplication(
+    notes: list[str],
+    tmp_path: pathlib.Path,
+    repeats: int,
+) -> list[float]:
+    durations = []
+    for _ in range(repeats):
+        # the database is created anew, and its creation isn't measured
+        for filename in tmp_path.glob('notes.db*'):
+            filename.unlink()
+
+        db_connection = db.connect_to_db(tmp_path / 'notes.db')
+        try:
+            start_time = time.perf_counter()
+            db.insert_many_in_db(
+                db_connection,
+                db.find_new_in_db(db_connection, notes),
+            )
+            durations.append(time.perf_counter() - start_time)
+        finally:
+            db_connection.close()
+
+    return durations
+
+def _measure_db_probes(
+    note: str,
+    db_file: pathlib.Path,
+    db_row_counts: typing.Iterable[int],
+) -> dict[str, dict[str, float]]:
+    results = {}
+    # the random numbers are the same between runs
+    random_generator = random.Random(0)
+    db_connection = db.connect_to_db(db_file)
+    try:
+        # the table grows from one row count to the next one
+        row_count = 0
+        for next_row_count in sorted(db_row_counts):
+            db.insert_many_in_db(
+                db_connection,
+                (
+                    f'{note} #{index}'
+                    for index in range(row_count, next_row_count)
+                ),
+            )
+            row_count = next_row_count
+
+            # half of the probed notes are missing in the table
+            durations = []
+            for probe_index in range(_DB_PROBE_COUNT):
+                index = random_generator.randrange(row_count)
+                probed_note = f'{note} #{index}' \
+                    if probe_index % 2 == 0 \
+                    else f'{note} #missing-{index}'
+
+                start_time = time.perf_counter()
+                db.exists_in_db(db_connection, probed_note)
+                durations.append(time.perf_counter() - start_time)
+
+            results[str(row_count)] = _get_statistics(durations)
+    finally:
+        db_connection.close()
+
+    return results
+
+def _measure_rendering(
+    note: str,
+    image_parameters: types.ImageParameters,
+    text_parameters: types.TextParameters,
+    image_file: pathlib.Path,
+    repeats: int,
+) -> dict[str, list[float]]:
+    profiler_enabled = profiling.profiler.enabled
+    profiling.profiler.enabled = True
+    profiling.profiler.pop_stage_times()
+    try:
+        for _ in range(repeats):
+            renderer = generation.Renderer(
+                image_parameters,
+                text_parameters,
+                types.WatermarkParameters(),
+            )
+            # the cache is cleared to measure the cold layout
+            text.text_box_cache.clear()
+            image = renderer.render(note)
+            encoded_image = generation.encode_image_with_timing(
+                image,
+                types.EncodingParameters(),
+            )
+            writing.write_image_file(image_file, encoded_image.data)
+
+        return profiling.profiler.pop_stage_times()
+    finally:
+        profiling.profiler.enabled = profiler_enabled
+
+def _measure_stage(stage: _Stage, repeats: int) -> list[float]:
+    durations = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        stage()
+        durations.append(time.perf_counter() - start_time)
+
+    return durations
+
+def _get_statistics(durations: list[float]) -> dict[str, float]:
+    return {
+        'min': min(durations),
+        'median': statistics.median(durations),
+        'mean': statistics.mean(durations),
+    }
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import unittest
+import pathlib
+
+from . import bench
+
+_RESOURCES_PATH = pathlib.Path(__file__).parent.parent / 'resources'
+
+class TestRunBenchmarks(unittest.TestCase):
+  def test_run_benchmarks(self) -> None:
+    results = bench.run_benchmarks(_RESOURCES_PATH, 1, 2, [100, 10])
+
+    self.assertEqual(results['repeats'], 1)
+    self.assertEqual(results['note_count'], 2)
+    self.assertEqual(
+      list(results['results']),
+      ['short', 'long', 'many_lines'],
+    )
+    for case_results in results['results'].values():
+      self.assertEqual(list(case_results), [
+        'reading',
+        'dedup',
+        'rectangle_fitting',
+        'wrapping',
+        'drawing',
+        'encoding',
+        'saving',
+      ])
+      for stage_results in case_results.values():
+        self.assertGreaterEqual(stage_results['min'], 0.0)
+        self.assertLessEqual(stage_results['min'], stage_results['median'])
+
+    self.assertEqual(list(results['db_probe']), ['10', '100'])
+    for probe_results in results['db_probe'].values():
+      self.assertGreaterEqual(probe_results['min'], 0.0)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+import math
+import struct
+import pathlib
+
+_FILE_MAGIC = b'WGBF'
+_FILE_HEADER = struct.Struct('<4sQQQQ')
+_MINIMAL_DIGEST_SIZE = 16
+
+class BloomFilter:
+    def __init__(self, bit_count: int, hash_count: int) -> None:
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.item_count = 0
+
+        self._bits = bytearray((bit_count + 7) // 8)
+
+    @staticmethod
+    def create(memory: int, error_rate: float) -> BloomFilter:
+        # the optimal number of hashes depends only on the error rate;
+        # the filter size then defines its capacity
+        hash_count = max(1, round(-math.log2(error_rate)))
+        return BloomFilter(memory * 8, hash_count)
+
+    @staticmethod
+    def load(filename: pathlib.Path) -> tuple[BloomFilter, int]:
+        with open(filename, mode='rb') as bloom_filter_file:
+            header = bloom_filter_file.read(_FILE_HEADER.size)
+            if len(header) != _FILE_HEADER.size:
+                raise ValueError('the Bloom filter file is truncated')
+
+            (magic, bit_count, hash_count, item_count, tag) = \
+                _FILE_HEADER.unpack(header)
+            if magic != _FILE_MAGIC:
+                raise ValueError('the Bloom filter file has an unknown format')
+
+            bloom_filter = BloomFilter(bit_count, hash_count)
+            bloom_filter.item_count = item_count
+            if bloom_filter_file.readinto(bloom_filter._bits) \
+                != len(bloom_filter._bits):
+                raise ValueError('the Bloom filter file is truncated')
+
+        return (bloom_filter, tag)
+
+    @property
+    def capacity(self) -> int:
+        # the number of items for which the expected error rate is kept
+        return int(self.bit_count * math.log(2) / self.hash_count)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(
+            self._bits[index >> 3] & (1 << (index & 7))
+            for index in self._get_indices(digest)
+        )
+
+    def add(self, digest: bytes) -> None:
+        for index in self._get_indices(digest):
+            self._bits[index >> 3] |= 1 << (index & 7)
+
+        self.item_count += 1
+
+    def save(self, filename: pathlib.Path, tag: int) -> None:
+        temporary_filename = filename.with_name(filename.name + '.tmp')
+        with open(temporary_filename, mode='wb') as bloom_filter_file:
+            bloom_filter_file.write(_FILE_HEADER.pack(
+                _FILE_MAGIC,
+                self.bit_count,
+                self.hash_count,
+                self.item_count,
+                tag,
+            ))
+            bloom_filter_file.write(self._bits)
+
+        temporary_filename.replace(filename)
+
+    def _get_indices(self, digest: bytes) -> list[int]:
+        # the digest is already a hash, so its halves are used
+        # for the double hashing instead of computing new hashes
+        if len(digest) < _MINIMAL_DIGEST_SIZE:
+            raise ValueError(f'the digest is too short: {len(digest)} bytes')
+
+        first_hash = int.from_bytes(digest[:8], 'little')
+        second_hash = int.from_bytes(digest[8:16], 'little') | 1
+        return [
+            (first_hash + hash_number * second_hash) % self.bit_count
+            for hash_number in range(self.hash_count)
+        ]
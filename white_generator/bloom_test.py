@@ -0,0 +1,65 @@
+import unittest
+import tempfile
+import pathlib
+import hashlib
+
+from . import bloom
+
+def _get_digest(text: str) -> bytes:
+  return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+class TestBloomFilter(unittest.TestCase):
+  def test_create(self) -> None:
+    bloom_filter = bloom.BloomFilter.create(1024, 0.01)
+
+    self.assertEqual(bloom_filter.bit_count, 8192)
+    self.assertEqual(bloom_filter.hash_count, 7)
+    self.assertEqual(bloom_filter.capacity, 811)
+
+  def test_added_items(self) -> None:
+    bloom_filter = bloom.BloomFilter.create(1024, 0.01)
+    for index in range(100):
+      bloom_filter.add(_get_digest(f'note #{index}'))
+
+    for index in range(100):
+      self.assertTrue(_get_digest(f'note #{index}') in bloom_filter)
+    self.assertEqual(bloom_filter.item_count, 100)
+
+  def test_error_rate(self) -> None:
+    bloom_filter = bloom.BloomFilter.create(1024, 0.01)
+    for index in range(bloom_filter.capacity):
+      bloom_filter.add(_get_digest(f'note #{index}'))
+
+    false_positive_count = sum(
+      _get_digest(f'other note #{index}') in bloom_filter
+      for index in range(10000)
+    )
+    self.assertLess(false_positive_count, 200)
+
+  def test_too_short_digest(self) -> None:
+    bloom_filter = bloom.BloomFilter.create(1024, 0.01)
+    with self.assertRaises(ValueError):
+      bloom_filter.add(b'digest')
+
+  def test_save_and_load(self) -> None:
+    bloom_filter = bloom.BloomFilter.create(1024, 0.01)
+    bloom_filter.add(_get_digest('note #1'))
+
+    with tempfile.TemporaryDirectory(prefix='white-generator-') as tmp_dir:
+      filename = pathlib.Path(tmp_dir) / 'notes.bloom'
+      bloom_filter.save(filename, 42)
+      (loaded_bloom_filter, tag) = bloom.BloomFilter.load(filename)
+
+    self.assertEqual(tag, 42)
+    self.assertEqual(loaded_bloom_filter.bit_count, bloom_filter.bit_count)
+    self.assertEqual(loaded_bloom_filter.hash_count, bloom_filter.hash_count)
+    self.assertEqual(loaded_bloom_filter.item_count, 1)
+    self.assertTrue(_get_digest('note #1') in loaded_bloom_filter)
+
+  def test_load_of_unknown_format(self) -> None:
+    with tempfile.TemporaryDirectory(prefix='white-generator-') as tmp_dir:
+      filename = pathlib.Path(tmp_dir) / 'notes.bloom'
+      filename.write_bytes(b'unknown format' * 10)
+
+      with self.assertRaises(ValueError):
+        bloom.BloomFilter.load(filename)
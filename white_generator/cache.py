@@ -0,0 +1,122 @@
+import os
+import shutil
+import pathlib
+import hashlib
+import threading
+import collections
+import typing
+
+_READING_BLOCK_SIZE = 1 << 20
+
+_Key = typing.TypeVar('_Key', bound=typing.Hashable)
+_Value = typing.TypeVar('_Value')
+
+class LRUCache(typing.Generic[_Key, _Value]):
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._items: collections.OrderedDict[_Key, _Value] = \
+            collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests != 0 else 0.0
+
+    def get(
+        self,
+        key: _Key,
+        compute_value: typing.Callable[[], _Value],
+    ) -> _Value:
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key]
+
+            self.misses += 1
+
+        # the value is computed without the lock to not block other threads
+        value = compute_value()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+class RenderingCache:
+    def __init__(
+        self,
+        cache_path: pathlib.Path,
+        versions: typing.Sequence[str],
+        files: typing.Iterable[pathlib.Path | None],
+    ) -> None:
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+
+        # the note IDs already depend on the note texts and the parameters,
+        # but not on the contents of the used files and the library versions
+        self._digest = hashlib.blake2b(repr(tuple(versions)).encode())
+        for file in files:
+            if file is not None:
+                self._digest.update(_get_file_digest(file))
+
+    def get_cache_file(self, note_id: str, extension: str) -> pathlib.Path:
+        digest = self._digest.copy()
+        digest.update(note_id.encode())
+
+        fingerprint = digest.hexdigest()
+        return self.cache_path / fingerprint[:2] / (fingerprint + '.' + extension)
+
+    def restore(self, cache_file: pathlib.Path, image_file: pathlib.Path) -> bool:
+        # the image is replaced via a temporary file like on writing, so
+        # the writing of the image later doesn't change the cached one
+        temporary_image_file = image_file.with_name(
+            f'{image_file.name}.{os.getpid()}.{threading.get_ident()}.tmp',
+        )
+        temporary_image_file.unlink(missing_ok=True)
+        try:
+            os.link(cache_file, temporary_image_file)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        except OSError:
+            # the hard links are impossible between different file systems
+            try:
+                shutil.copyfile(cache_file, temporary_image_file)
+            except FileNotFoundError:
+                self.misses += 1
+                return False
+
+        temporary_image_file.replace(image_file)
+        self.hits += 1
+        return True
+
+    def prepare_cache_file(self, note_id: str, extension: str) -> pathlib.Path:
+        # the cache file itself is written by the caller like the images
+        cache_file = self.get_cache_file(note_id, extension)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        return cache_file
+
+def _get_file_digest(file: pathlib.Path) -> bytes:
+    digest = hashlib.blake2b()
+    with open(file, 'rb') as opened_file:
+        while block := opened_file.read(_READING_BLOCK_SIZE):
+            digest.update(block)
+
+    return digest.digest()
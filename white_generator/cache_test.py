@@ -0,0 +1,126 @@
+import unittest
+import unittest.mock
+import tempfile
+import pathlib
+
+from . import cache
+from . import writing
+
+class TestLRUCache(unittest.TestCase):
+  def test_miss(self) -> None:
+    lru_cache: cache.LRUCache[str, int] = cache.LRUCache(2)
+    compute_value = unittest.mock.Mock(side_effect=[23])
+
+    value = lru_cache.get('one', compute_value)
+
+    self.assertEqual(value, 23)
+    self.assertEqual((lru_cache.hits, lru_cache.misses), (0, 1))
+    self.assertEqual(compute_value.call_count, 1)
+
+  def test_hit(self) -> None:
+    lru_cache: cache.LRUCache[str, int] = cache.LRUCache(2)
+    compute_value = unittest.mock.Mock(side_effect=[23])
+
+    lru_cache.get('one', compute_value)
+    value = lru_cache.get('one', compute_value)
+
+    self.assertEqual(value, 23)
+    self.assertEqual((lru_cache.hits, lru_cache.misses), (1, 1))
+    self.assertEqual(lru_cache.hit_rate, 0.5)
+    self.assertEqual(compute_value.call_count, 1)
+
+  def test_eviction_of_least_recently_used(self) -> None:
+    lru_cache: cache.LRUCache[str, int] = cache.LRUCache(2)
+
+    lru_cache.get('one', lambda: 1)
+    lru_cache.get('two', lambda: 2)
+    lru_cache.get('one', lambda: 1)
+    lru_cache.get('three', lambda: 3)
+    value = lru_cache.get('two', lambda: 42)
+
+    self.assertEqual(value, 42)
+    self.assertEqual(len(lru_cache), 2)
+    self.assertEqual(lru_cache.get('three', lambda: 42), 3)
+
+  def test_clear(self) -> None:
+    lru_cache: cache.LRUCache[str, int] = cache.LRUCache(2)
+
+    lru_cache.get('one', lambda: 1)
+    lru_cache.get('one', lambda: 1)
+    lru_cache.clear()
+
+    self.assertEqual(len(lru_cache), 0)
+    self.assertEqual((lru_cache.hits, lru_cache.misses), (0, 0))
+    self.assertEqual(lru_cache.hit_rate, 0.0)
+
+class TestRenderingCache(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.path = pathlib.Path(self._tmpDir.name)
+    self.font_file = self.path / 'font.ttf'
+    self.font_file.write_bytes(b'font #1')
+
+  def tearDown(self) -> None:
+    self._tmpDir.cleanup()
+
+  def test_cache_file(self) -> None:
+    rendering_cache = cache.RenderingCache(self.path / 'cache', ['1.0'], [None])
+
+    cache_file = rendering_cache.get_cache_file('id #1', 'png')
+
+    self.assertEqual(cache_file.suffix, '.png')
+    self.assertEqual(cache_file.parent.parent, self.path / 'cache')
+    self.assertEqual(cache_file.parent.name, cache_file.name[:2])
+    self.assertNotEqual(
+      rendering_cache.get_cache_file('id #2', 'png'),
+      cache_file,
+    )
+
+  def test_cache_file_with_changed_file(self) -> None:
+    rendering_cache = cache.RenderingCache(self.path, ['1.0'], [self.font_file])
+    cache_file = rendering_cache.get_cache_file('id #1', 'png')
+
+    self.font_file.write_bytes(b'font #2')
+    changed_rendering_cache = cache.RenderingCache(self.path, ['1.0'], [self.font_file])
+
+    self.assertNotEqual(
+      changed_rendering_cache.get_cache_file('id #1', 'png'),
+      cache_file,
+    )
+
+  def test_cache_file_with_changed_version(self) -> None:
+    rendering_cache = cache.RenderingCache(self.path, ['1.0'], [])
+    changed_rendering_cache = cache.RenderingCache(self.path, ['1.1'], [])
+
+    self.assertNotEqual(
+      changed_rendering_cache.get_cache_file('id #1', 'png'),
+      rendering_cache.get_cache_file('id #1', 'png'),
+    )
+
+  def test_restore_miss(self) -> None:
+    rendering_cache = cache.RenderingCache(self.path / 'cache', ['1.0'], [])
+    image_file = self.path / 'image.png'
+
+    restored = rendering_cache.restore(
+      rendering_cache.get_cache_file('id #1', 'png'),
+      image_file,
+    )
+
+    self.assertFalse(restored)
+    self.assertFalse(image_file.exists())
+    self.assertEqual((rendering_cache.hits, rendering_cache.misses), (0, 1))
+
+  def test_store_and_restore(self) -> None:
+    rendering_cache = cache.RenderingCache(self.path / 'cache', ['1.0'], [])
+    cache_file = rendering_cache.prepare_cache_file('id #1', 'png')
+    image_file = self.path / 'image.png'
+
+    writing.write_image_file(cache_file, b'image #1')
+    restored = rendering_cache.restore(cache_file, image_file)
+    writing.write_image_file(image_file, b'image #2')
+
+    self.assertTrue(restored)
+    self.assertEqual((rendering_cache.hits, rendering_cache.misses), (1, 0))
+    self.assertEqual(cache_file, rendering_cache.get_cache_file('id #1', 'png'))
+    self.assertEqual(cache_file.read_bytes(), b'image #1')
+    self.assertEqual(image_file.read_bytes(), b'image #2')
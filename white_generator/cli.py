@@ -8,8 +8,13 @@ from PIL import Image
 
 from . import __version__
 from . import types
+from . import profiling
+from . import io
 
 DEFAULT_OUTPUT_PATH = pathlib.Path('output')
+DEFAULT_BLOOM_FILTER_MEMORY = 16
+DEFAULT_BLOOM_FILTER_ERROR_RATE = 0.01
+DEFAULT_WRITER_QUEUE_SIZE = 16
 
 @dataclasses.dataclass
 class Options:
@@ -17,11 +22,31 @@ class Options:
     output_path: pathlib.Path = DEFAULT_OUTPUT_PATH
     image: types.ImageParameters = \
         dataclasses.field(default_factory=types.ImageParameters)
+    fill: types.FillParameters = \
+        dataclasses.field(default_factory=types.FillParameters)
     text: types.TextParameters = \
         dataclasses.field(default_factory=types.TextParameters)
     watermark: types.WatermarkParameters = \
         dataclasses.field(default_factory=types.WatermarkParameters)
+    encoding: types.EncodingParameters = \
+        dataclasses.field(default_factory=types.EncodingParameters)
+    atlas: types.AtlasParameters = \
+        dataclasses.field(default_factory=types.AtlasParameters)
     no_database: bool = False
+    jobs: int = 1
+    skip_existing: bool = False
+    incremental: bool = False
+    rendering_cache: bool = False
+    rendering_cache_path: pathlib.Path | None = None
+    bloom_filter: bool = False
+    bloom_filter_memory: int = DEFAULT_BLOOM_FILTER_MEMORY
+    bloom_filter_error_rate: float = DEFAULT_BLOOM_FILTER_ERROR_RATE
+    writer_threads: int = 0
+    writer_queue_size: int = DEFAULT_WRITER_QUEUE_SIZE
+    max_inflight_images: int | None = None
+    profile: bool = False
+    profile_file: pathlib.Path | None = None
+    profile_format: profiling.ReportFormat = profiling.ReportFormat.JSON
 
     def __post_init__(self) -> None:
         self._initialized = True
@@ -32,10 +57,13 @@ class Options:
             return
 
         _set_attr_with_prefix("image_", self.image, name, value)
+        _set_attr_with_prefix("fill_", self.fill, name, value)
         _set_attr_with_prefix("text_font_", self.text.font, name, value)
         _set_attr_with_prefix("text_rectangle_", self.text.rectangle, name, value)
         _set_attr_with_prefix("text_", self.text, name, value)
         _set_attr_with_prefix("watermark_", self.watermark, name, value)
+        _set_attr_with_prefix("encoding_", self.encoding, name, value)
+        _set_attr_with_prefix("atlas_", self.atlas, name, value)
 
 class HelpFormatter(
     argparse.RawTextHelpFormatter,
@@ -44,7 +72,16 @@ class HelpFormatter(
     pass
 
 def parse_options() -> Options:
-    parser = argparse.ArgumentParser(
+    parser = create_parser()
+    options = parser.parse_args(namespace=Options())
+    check_options(parser, options)
+
+    return options
+
+def create_parser(
+    parser_class: type[argparse.ArgumentParser] = argparse.ArgumentParser,
+) -> argparse.ArgumentParser:
+    parser = parser_class(
         prog=__package__.replace('_', '-'),
         formatter_class=HelpFormatter,
     )
@@ -61,7 +98,9 @@ def parse_options() -> Options:
         '--input-file',
         type=pathlib.Path,
         required=True,
-        help='the path to the file with notes',
+        help='the path to the file with notes ' \
+            + '(if the value is "-", the standard input is used; ' \
+            + '.gz and .zst files are decompressed)',
     )
     parser.add_argument(
         '-o',
@@ -143,6 +182,48 @@ def parse_options() -> Options:
         type=pathlib.Path,
         help='the path to the background image',
     )
+    parser.add_argument(
+        '--image-background-directory',
+        type=pathlib.Path,
+        help='the path to the directory with background images ' \
+            + '(one of them is chosen for each note)',
+    )
+    parser.add_argument(
+        '--image-background-choice',
+        type=_parse_background_choice,
+        choices=tuple(types.BackgroundChoice),
+        default=types.DEFAULT_IMAGE_BACKGROUND_CHOICE,
+        help='the choice of a background image from the directory ' \
+            + '(by the hash of a note or at random)',
+    )
+    parser.add_argument(
+        '--image-background-cache-size',
+        type=parse_positive_integer,
+        default=types.DEFAULT_IMAGE_BACKGROUND_CACHE_SIZE,
+        help='the number of decoded background images from the directory ' \
+            + 'kept in memory by each process',
+    )
+    parser.add_argument(
+        '--fill-type',
+        type=_parse_fill_type,
+        choices=list(types.FillType),
+        default=types.DEFAULT_FILL_TYPE,
+        help='the fill of the background without an image ' \
+            + '(the gradients and patterns go from the background color ' \
+            + 'to the second color and require the numpy package)',
+    )
+    parser.add_argument(
+        '--fill-second-color',
+        type=types.Color.parse,
+        default=types.DEFAULT_FILL_SECOND_COLOR,
+        help='the second color of the gradient and pattern fills',
+    )
+    parser.add_argument(
+        '--fill-pattern-size',
+        type=parse_positive_integer,
+        default=types.DEFAULT_FILL_PATTERN_SIZE,
+        help='the cell size of the checkerboard and the stripe width',
+    )
     parser.add_argument(
         '-F',
         '--image-resizing-filter',
@@ -164,6 +245,13 @@ def parse_options() -> Options:
         default=types.DEFAULT_FONT_SIZE,
         help='the font size',
     )
+    parser.add_argument(
+        '--text-font-size-auto',
+        type=parse_size_range,
+        metavar='MIN:MAX',
+        help='select the largest font size in the range ' \
+            + 'at which a note fits the text rectangle',
+    )
     parser.add_argument(
         '-c',
         '--text-font-color',
@@ -190,6 +278,11 @@ def parse_options() -> Options:
         default=types.DEFAULT_WATERMARK_COLOR,
         help='the watermark font color',
     )
+    parser.add_argument(
+        '--watermark-image',
+        type=pathlib.Path,
+        help='the path to the watermark image (e.g. a logo in the PNG format)',
+    )
     parser.add_argument(
         "--no-database",
         action="store_true",
@@ -201,8 +294,217 @@ def parse_options() -> Options:
         dest="image_no_resizing",
         help="don't resize the background image",
     )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=parse_positive_integer,
+        default=1,
+        help='the number of processes for generating images',
+    )
+    parser.add_argument(
+        "--skip-existing",
+        action="store_true",
+        help="don't generate images that already exist in the output path",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="read only the notes appended to the input file after the last run " \
+            + "(if the read part was changed, the file is read from the start; " \
+            + "only uncompressed files are supported)",
+    )
+    parser.add_argument(
+        "--rendering-cache",
+        action="store_true",
+        help="take the images rendered with the same parameters, fonts " \
+            + "and images from the cache instead of rendering them",
+    )
+    parser.add_argument(
+        '--rendering-cache-path',
+        type=pathlib.Path,
+        help='the path to the rendering cache ' \
+            + '(if none, it is stored in the application directory)',
+    )
+    parser.add_argument(
+        "--bloom-filter",
+        action="store_true",
+        help="check notes by the Bloom filter before the database",
+    )
+    parser.add_argument(
+        '--bloom-filter-memory',
+        type=parse_positive_integer,
+        default=DEFAULT_BLOOM_FILTER_MEMORY,
+        help='the memory size of the Bloom filter in MiB',
+    )
+    parser.add_argument(
+        '--bloom-filter-error-rate',
+        type=_parse_probability,
+        default=DEFAULT_BLOOM_FILTER_ERROR_RATE,
+        help='the false positive rate of the Bloom filter',
+    )
+
+    parser.add_argument(
+        '--output-format',
+        type=_parse_image_format,
+        choices=tuple(
+            image_format
+            for image_format in types.ImageFormat
+            if image_format.is_supported
+        ),
+        default=types.DEFAULT_ENCODING_FORMAT,
+        dest='encoding_format',
+        help='the format of generated images',
+    )
+    parser.add_argument(
+        '--compress-level',
+        type=int,
+        choices=range(10),
+        dest='encoding_compress_level',
+        metavar='{0..9}',
+        help='the compression level for the PNG format ' \
+            + "(if none, the Pillow library's default level is used)",
+    )
+    parser.add_argument(
+        '--quality',
+        type=int,
+        choices=range(101),
+        dest='encoding_quality',
+        metavar='{0..100}',
+        help='the quality for the lossy formats ' \
+            + "(if none, the Pillow library's default quality is used)",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        dest="encoding_optimize",
+        help="make an extra pass to select the optimal encoder settings",
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        dest="encoding_quantize",
+        help="convert images to a palette of 256 colors (only for the PNG format)",
+    )
+
+    parser.add_argument(
+        '--writer-threads',
+        type=_parse_non_negative_integer,
+        default=0,
+        help='the number of threads for writing images in the background ' \
+            + '(if the value is zero, images are written synchronously)',
+    )
+    parser.add_argument(
+        '--writer-queue-size',
+        type=parse_positive_integer,
+        default=DEFAULT_WRITER_QUEUE_SIZE,
+        help='the maximal number of images waiting for writing',
+    )
+    parser.add_argument(
+        '--max-inflight-images',
+        type=parse_positive_integer,
+        help='the maximal number of images rendered in the processes, ' \
+            + 'waiting for their saving or held by an atlas at once ' \
+            + '(if none, it is four times the number of processes)',
+    )
+
+    parser.add_argument(
+        '--atlas-note-count',
+        type=_parse_non_negative_integer,
+        default=0,
+        help='the number of notes packed into one atlas image ' \
+            + 'with a JSON index of their rectangles ' \
+            + '(if the value is zero, each note is saved in a separate image)',
+    )
+    parser.add_argument(
+        '--atlas-columns',
+        type=parse_positive_integer,
+        help='the number of columns in an atlas image ' \
+            + '(if none, an atlas image is close to a square)',
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="measure the generation stages and report their percentiles",
+    )
+    parser.add_argument(
+        '--profile-file',
+        type=pathlib.Path,
+        help='the path to the file with the profiling report ' \
+            + '(it enables the profiling)',
+    )
+    parser.add_argument(
+        '--profile-format',
+        type=_parse_report_format,
+        choices=tuple(profiling.ReportFormat),
+        default=profiling.ReportFormat.JSON,
+        help='the format of the profiling report file ' \
+            + '(the cProfile statistics cover only the main process)',
+    )
+
+    return parser
+
+def check_options(parser: argparse.ArgumentParser, options: Options) -> None:
+    if options.encoding.quantize \
+        and options.encoding.format != types.ImageFormat.PNG:
+        parser.error('the quantization is supported only for the PNG format')
+    if options.watermark.text is not None \
+        and options.watermark.image is not None:
+        parser.error('the watermark text and image are mutually exclusive')
+    if options.image.background_directory is not None:
+        if options.image.background_image is not None:
+            parser.error('the background image and directory ' \
+                + 'are mutually exclusive')
+        if options.image.no_resizing:
+            parser.error('the background images from the directory ' \
+                + 'are always resized')
+    if options.incremental and options.input_file is not None \
+        and (options.input_file == io.STDIN_FILENAME \
+            or options.input_file.suffix in ('.gz', '.zst')):
+        parser.error('the incremental mode supports only uncompressed files')
+    if options.skip_existing and options.atlas.note_count > 0:
+        parser.error('the skipping of existing images is not supported ' \
+            + 'in the atlas mode')
+    if options.rendering_cache and options.atlas.note_count > 0:
+        parser.error('the rendering cache is not supported in the atlas mode')
+    if options.max_inflight_images is not None \
+        and options.max_inflight_images <= options.atlas.note_count:
+        parser.error('the maximal number of images in memory must exceed ' \
+            + 'the number of notes in an atlas')
+
+def parse_positive_integer(text: str) -> int:
+    try:
+        value = int(text)
+    except ValueError as exception:
+        raise argparse.ArgumentTypeError(f"invalid integer: {exception}") from exception
+
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"the value must be positive: {value}")
 
-    return parser.parse_args(namespace=Options())
+    return value
+
+def parse_positive_number(text: str) -> float:
+    try:
+        value = float(text)
+    except ValueError as exception:
+        raise argparse.ArgumentTypeError(f"invalid number: {exception}") from exception
+
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"the value must be positive: {value}")
+
+    return value
+
+def parse_size_range(text: str) -> tuple[int, int]:
+    (minimal_text, separator, maximal_text) = text.partition(':')
+    if separator == '':
+        raise argparse.ArgumentTypeError(f"the range must be in the MIN:MAX format: {text}")
+
+    minimal_size = parse_positive_integer(minimal_text)
+    maximal_size = parse_positive_integer(maximal_text)
+    if minimal_size > maximal_size:
+        raise argparse.ArgumentTypeError(f"the minimum is greater than the maximum: {text}")
+
+    return (minimal_size, maximal_size)
 
 def _parse_horizontal_align(text: str) -> types.HorizontalAlign:
     try:
@@ -216,12 +518,58 @@ def _parse_vertical_align(text: str) -> types.VerticalAlign:
     except KeyError as exception:
         raise argparse.ArgumentTypeError(f"unknown vertical align: {exception}") from exception
 
+def _parse_background_choice(text: str) -> types.BackgroundChoice:
+    try:
+        return types.BackgroundChoice[text.upper()]
+    except KeyError as exception:
+        raise argparse.ArgumentTypeError(f"unknown background choice: {exception}") from exception
+
+def _parse_fill_type(text: str) -> types.FillType:
+    try:
+        return types.FillType[text.upper()]
+    except KeyError as exception:
+        raise argparse.ArgumentTypeError(f"unknown fill type: {exception}") from exception
+
+def _parse_image_format(text: str) -> types.ImageFormat:
+    try:
+        return types.ImageFormat[text.upper()]
+    except KeyError as exception:
+        raise argparse.ArgumentTypeError(f"unknown image format: {exception}") from exception
+
+def _parse_report_format(text: str) -> profiling.ReportFormat:
+    try:
+        return profiling.ReportFormat[text.upper()]
+    except KeyError as exception:
+        raise argparse.ArgumentTypeError(f"unknown report format: {exception}") from exception
+
 def _parse_image_resampling(text: str) -> Image.Resampling:
     try:
         return Image.Resampling[text.upper()]
     except KeyError as exception:
         raise argparse.ArgumentTypeError(f"unknown image resampling: {exception}") from exception
 
+def _parse_non_negative_integer(text: str) -> int:
+    try:
+        value = int(text)
+    except ValueError as exception:
+        raise argparse.ArgumentTypeError(f"invalid integer: {exception}") from exception
+
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"the value must be non-negative: {value}")
+
+    return value
+
+def _parse_probability(text: str) -> float:
+    try:
+        value = float(text)
+    except ValueError as exception:
+        raise argparse.ArgumentTypeError(f"invalid number: {exception}") from exception
+
+    if not 0 < value < 1:
+        raise argparse.ArgumentTypeError(f"the value must be between 0 and 1: {value}")
+
+    return value
+
 def _set_attr_with_prefix(prefix: str, obj: object, name: str, value: typing.Any) -> None:
     if name.startswith(prefix):
         setattr(obj, name.removeprefix(prefix), value)
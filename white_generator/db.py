@@ -1,31 +1,186 @@
 import sqlite3
 import pathlib
+import hashlib
+import typing
+
+from . import bloom
+
+_DB_VERSION = 1
+_DIGEST_SIZE = 16
+
+def connect_to_db(db_file: pathlib.Path | None = None) -> sqlite3.Connection:
+    if db_file is None:
+        db_file = get_app_dir() / 'notes.db'
 
-def connect_to_db() -> sqlite3.Connection:
-    db_file = _get_app_dir() / 'notes.db'
     db_connection = sqlite3.connect(db_file)
+    # the write-ahead log requires fsync only on checkpoints, not on each commit
+    db_connection.execute('PRAGMA journal_mode=WAL')
+    db_connection.execute('PRAGMA synchronous=NORMAL')
+    db_connection.create_function(
+        'note_digest',
+        1,
+        get_digest,
+        deterministic=True,
+    )
     with db_connection:
-        db_connection.execute('''CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            text TEXT NOT NULL UNIQUE
-        )''')
+        _migrate_db(db_connection)
 
     return db_connection
 
 def insert_in_db(db_connection: sqlite3.Connection, text: str) -> None:
     with db_connection:
-        db_connection.execute('INSERT INTO notes(text) VALUES(?)', (text,))
+        db_connection.execute(
+            'INSERT INTO notes(text, digest) VALUES(?, ?)',
+            (text, get_digest(text)),
+        )
 
 def exists_in_db(db_connection: sqlite3.Connection, text: str) -> bool:
     (counter,) = db_connection \
-        .execute('SELECT count(*) FROM notes WHERE text=?', (text,)) \
+        .execute(
+            'SELECT count(*) FROM notes WHERE digest=?',
+            (get_digest(text),),
+        ) \
         .fetchone()
 
     return bool(counter)
 
-def _get_app_dir() -> pathlib.Path:
+def find_new_in_db(
+    db_connection: sqlite3.Connection,
+    texts: typing.Iterable[str],
+    bloom_filter: bloom.BloomFilter | None = None,
+) -> list[str]:
+    new_notes = []
+    new_digests = set()
+    # the notes that are definitely new according to the Bloom filter
+    # don't need the duplicate check, and the others are checked by one query
+    possibly_existing_digests = []
+    for text in texts:
+        digest = get_digest(text)
+        if digest in new_digests:
+            continue
+
+        if bloom_filter is None or digest in bloom_filter:
+            possibly_existing_digests.append(digest)
+
+        new_notes.append((text, digest))
+        new_digests.add(digest)
+
+    existing_digests = set()
+    if possibly_existing_digests:
+        parameters = ', '.join('?' * len(possibly_existing_digests))
+        existing_digests = {
+            digest
+            for (digest,) in db_connection.execute(
+                f'SELECT digest FROM notes WHERE digest IN ({parameters})',
+                possibly_existing_digests,
+            )
+        }
+
+    return [
+        text
+        for text, digest in new_notes
+        if digest not in existing_digests
+    ]
+
+def insert_many_in_db(
+    db_connection: sqlite3.Connection,
+    texts: typing.Iterable[str],
+    bloom_filter: bloom.BloomFilter | None = None,
+) -> None:
+    notes = [(text, get_digest(text)) for text in texts]
+    # other processes can insert the same notes after their checking
+    with db_connection:
+        db_connection.executemany(
+            'INSERT OR IGNORE INTO notes(text, digest) VALUES(?, ?)',
+            notes,
+        )
+
+    if bloom_filter is not None:
+        for _, digest in notes:
+            bloom_filter.add(digest)
+
+def load_bloom_filter(
+    db_connection: sqlite3.Connection,
+    memory: int,
+    error_rate: float,
+    bloom_filter_file: pathlib.Path | None = None,
+) -> bloom.BloomFilter:
+    if bloom_filter_file is None:
+        bloom_filter_file = get_app_dir() / 'notes.bloom'
+
+    # the filter file is valid only if no notes were added after its saving
+    expected_bloom_filter = bloom.BloomFilter.create(memory, error_rate)
+    if bloom_filter_file.exists():
+        try:
+            (bloom_filter, last_note_id) = \
+                bloom.BloomFilter.load(bloom_filter_file)
+            if last_note_id == _get_last_note_id(db_connection) \
+                and bloom_filter.bit_count == expected_bloom_filter.bit_count \
+                and bloom_filter.hash_count == expected_bloom_filter.hash_count:
+                return bloom_filter
+        except (OSError, ValueError):
+            pass
+
+    for (digest,) in db_connection.execute('SELECT digest FROM notes'):
+        expected_bloom_filter.add(digest)
+
+    return expected_bloom_filter
+
+def save_bloom_filter(
+    db_connection: sqlite3.Connection,
+    bloom_filter: bloom.BloomFilter,
+    bloom_filter_file: pathlib.Path | None = None,
+) -> None:
+    if bloom_filter_file is None:
+        bloom_filter_file = get_app_dir() / 'notes.bloom'
+
+    bloom_filter.save(bloom_filter_file, _get_last_note_id(db_connection))
+
+def get_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=_DIGEST_SIZE).digest()
+
+def get_app_dir() -> pathlib.Path:
     app_dir = pathlib.Path.home() / ('.' + __package__.replace('_', '-'))
     app_dir.mkdir(parents=True, exist_ok=True)
 
     return app_dir
+
+def _migrate_db(db_connection: sqlite3.Connection) -> None:
+    (version,) = db_connection.execute('PRAGMA user_version').fetchone()
+    if version >= _DB_VERSION:
+        return
+
+    # the notes table of version 0 has the unique constraint on the full text,
+    # which can't be dropped in SQLite without recreating the table;
+    # the transaction is explicit, since DDL statements don't start it
+    db_connection.execute('BEGIN')
+    db_connection.execute('''CREATE TABLE notes_v1 (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        text TEXT NOT NULL,
+        digest BLOB NOT NULL UNIQUE
+    )''')
+    if _table_exists(db_connection, 'notes'):
+        db_connection.execute('''INSERT INTO notes_v1(id, timestamp, text, digest)
+            SELECT id, timestamp, text, note_digest(text) FROM notes''')
+        db_connection.execute('DROP TABLE notes')
+
+    db_connection.execute('ALTER TABLE notes_v1 RENAME TO notes')
+    db_connection.execute(f'PRAGMA user_version={_DB_VERSION:d}')
+
+def _get_last_note_id(db_connection: sqlite3.Connection) -> int:
+    (last_note_id,) = db_connection \
+        .execute('SELECT coalesce(max(id), 0) FROM notes') \
+        .fetchone()
+
+    return int(last_note_id)
+
+def _table_exists(db_connection: sqlite3.Connection, table_name: str) -> bool:
+    (counter,) = db_connection \
+        .execute(
+            "SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?",
+            (table_name,),
+        ) \
+        .fetchone()
+
+    return bool(counter)
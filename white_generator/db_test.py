@@ -0,0 +1,157 @@
+import unittest
+import tempfile
+import sqlite3
+import pathlib
+
+from . import db
+
+class TestFindNewInDb(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.db_connection = db.connect_to_db(pathlib.Path(self._tmpDir.name) / 'notes.db')
+
+  def tearDown(self) -> None:
+    self.db_connection.close()
+    self._tmpDir.cleanup()
+
+  def test_new_notes(self) -> None:
+    new_notes = db.find_new_in_db(self.db_connection, ['note #1', 'note #2'])
+
+    self.assertEqual(new_notes, ['note #1', 'note #2'])
+    self.assertFalse(db.exists_in_db(self.db_connection, 'note #1'))
+    self.assertFalse(db.exists_in_db(self.db_connection, 'note #2'))
+
+  def test_existing_notes(self) -> None:
+    db.insert_in_db(self.db_connection, 'note #1')
+
+    new_notes = db.find_new_in_db(self.db_connection, ['note #1', 'note #2'])
+    self.assertEqual(new_notes, ['note #2'])
+
+  def test_duplicated_notes_in_chunk(self) -> None:
+    new_notes = db.find_new_in_db(
+      self.db_connection,
+      ['note #1', 'note #2', 'note #1'],
+    )
+    self.assertEqual(new_notes, ['note #1', 'note #2'])
+
+  def test_inserted_notes(self) -> None:
+    db.insert_many_in_db(self.db_connection, ['note #1', 'note #2'])
+    db.insert_many_in_db(self.db_connection, ['note #2', 'note #3'])
+
+    new_notes = db.find_new_in_db(
+      self.db_connection,
+      ['note #1', 'note #2', 'note #3', 'note #4'],
+    )
+    self.assertEqual(new_notes, ['note #4'])
+
+  def test_journal_mode(self) -> None:
+    (journal_mode,) = self.db_connection.execute('PRAGMA journal_mode').fetchone()
+    self.assertEqual(journal_mode, 'wal')
+
+class TestFindNewInDbWithBloomFilter(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.db_connection = db.connect_to_db(pathlib.Path(self._tmpDir.name) / 'notes.db')
+    self.bloom_filter_file = pathlib.Path(self._tmpDir.name) / 'notes.bloom'
+
+  def tearDown(self) -> None:
+    self.db_connection.close()
+    self._tmpDir.cleanup()
+
+  def test_new_and_duplicated_notes(self) -> None:
+    db.insert_in_db(self.db_connection, 'note #1')
+    bloom_filter = db.load_bloom_filter(
+      self.db_connection,
+      1024,
+      0.01,
+      self.bloom_filter_file,
+    )
+
+    new_notes = db.find_new_in_db(
+      self.db_connection,
+      ['note #1', 'note #2', 'note #3', 'note #2'],
+      bloom_filter,
+    )
+    db.insert_many_in_db(self.db_connection, new_notes, bloom_filter)
+
+    self.assertEqual(new_notes, ['note #2', 'note #3'])
+    self.assertTrue(db.exists_in_db(self.db_connection, 'note #2'))
+    self.assertTrue(db.exists_in_db(self.db_connection, 'note #3'))
+    self.assertTrue(db.get_digest('note #2') in bloom_filter)
+
+  def test_saved_bloom_filter(self) -> None:
+    bloom_filter = db.load_bloom_filter(
+      self.db_connection,
+      1024,
+      0.01,
+      self.bloom_filter_file,
+    )
+    db.insert_many_in_db(self.db_connection, ['note #1'], bloom_filter)
+    db.save_bloom_filter(self.db_connection, bloom_filter, self.bloom_filter_file)
+
+    loaded_bloom_filter = db.load_bloom_filter(
+      self.db_connection,
+      1024,
+      0.01,
+      self.bloom_filter_file,
+    )
+    self.assertEqual(loaded_bloom_filter.item_count, 1)
+    self.assertTrue(db.get_digest('note #1') in loaded_bloom_filter)
+
+  def test_outdated_bloom_filter(self) -> None:
+    bloom_filter = db.load_bloom_filter(
+      self.db_connection,
+      1024,
+      0.01,
+      self.bloom_filter_file,
+    )
+    db.save_bloom_filter(self.db_connection, bloom_filter, self.bloom_filter_file)
+    db.insert_in_db(self.db_connection, 'note #1')
+
+    loaded_bloom_filter = db.load_bloom_filter(
+      self.db_connection,
+      1024,
+      0.01,
+      self.bloom_filter_file,
+    )
+    self.assertTrue(db.get_digest('note #1') in loaded_bloom_filter)
+
+class TestMigrateDb(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.db_file = pathlib.Path(self._tmpDir.name) / 'notes.db'
+
+  def tearDown(self) -> None:
+    self._tmpDir.cleanup()
+
+  def test_migration_from_version_0(self) -> None:
+    old_db_connection = sqlite3.connect(self.db_file)
+    with old_db_connection:
+      old_db_connection.execute('''CREATE TABLE notes (
+        id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        text TEXT NOT NULL UNIQUE
+      )''')
+      old_db_connection.execute("INSERT INTO notes(text) VALUES('note #1')")
+    old_db_connection.close()
+
+    db_connection = db.connect_to_db(self.db_file)
+    try:
+      self.assertTrue(db.exists_in_db(db_connection, 'note #1'))
+      self.assertFalse(db.exists_in_db(db_connection, 'note #2'))
+
+      (version,) = db_connection.execute('PRAGMA user_version').fetchone()
+      self.assertEqual(version, 1)
+    finally:
+      db_connection.close()
+
+  def test_repeated_connection(self) -> None:
+    db_connection = db.connect_to_db(self.db_file)
+    db.insert_in_db(db_connection, 'note #1')
+    db_connection.close()
+
+    db_connection = db.connect_to_db(self.db_file)
+    try:
+      self.assertTrue(db.exists_in_db(db_connection, 'note #1'))
+    finally:
+      db_connection.close()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import math
+import typing
+
+from PIL import Image
+
+from . import types
+
+if typing.TYPE_CHECKING:
+    import numpy
+    import numpy.typing
+
+    _Array: typing.TypeAlias = numpy.typing.NDArray[numpy.floating[typing.Any]]
+
+def create_background(
+    image_parameters: types.ImageParameters,
+    fill_parameters: types.FillParameters,
+) -> Image.Image:
+    first_color = tuple(image_parameters.background_color)
+    if fill_parameters.type == types.FillType.SOLID:
+        return Image.new('RGB', image_parameters.size, first_color)
+
+    try:
+        import numpy
+    except ImportError as exception:
+        raise Exception(
+            'the numpy package is required for gradient and pattern fills',
+        ) from exception
+
+    # the whole background is computed by array operations at once
+    # instead of per-pixel loops
+    (x, y) = numpy.meshgrid(
+        numpy.arange(image_parameters.width, dtype=numpy.float32),
+        numpy.arange(image_parameters.height, dtype=numpy.float32),
+    )
+    weights = _get_second_color_weights(x, y, fill_parameters)
+
+    # the alpha channels are ignored, since the background is opaque
+    first_pixel = numpy.array(first_color[:3], dtype=numpy.float32)
+    second_pixel = numpy.array(
+        tuple(fill_parameters.second_color)[:3],
+        dtype=numpy.float32,
+    )
+    pixels = first_pixel \
+        + weights[..., numpy.newaxis] * (second_pixel - first_pixel)
+    return Image.fromarray(numpy.rint(pixels).astype(numpy.uint8), 'RGB')
+
+def _get_second_color_weights(
+    x: _Array,
+    y: _Array,
+    fill_parameters: types.FillParameters,
+) -> _Array:
+    (height, width) = x.shape
+    match fill_parameters.type:
+        case types.FillType.HORIZONTAL:
+            return x / max(width - 1, 1)
+        case types.FillType.VERTICAL:
+            return y / max(height - 1, 1)
+        case types.FillType.RADIAL:
+            (center_x, center_y) = ((width - 1) / 2, (height - 1) / 2)
+            distances = ((x - center_x) ** 2 + (y - center_y) ** 2) ** 0.5
+            return distances / max(math.hypot(center_x, center_y), 1)
+        case types.FillType.CHECKERBOARD:
+            pattern_size = fill_parameters.pattern_size
+            return (x // pattern_size + y // pattern_size) % 2
+        case types.FillType.STRIPES:
+            stripes: _Array = (x + y) // fill_parameters.pattern_size
+            return stripes % 2
+        case _:
+            raise ValueError(f'unknown fill type: {fill_parameters.type}')
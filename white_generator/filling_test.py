@@ -0,0 +1,103 @@
+import unittest
+import importlib.util
+
+from . import types
+from . import filling
+
+_RED = types.Color.parse('rgb(255, 0, 0)')
+_BLUE = types.Color.parse('rgb(0, 0, 255)')
+
+class TestCreateBackground(unittest.TestCase):
+  def test_solid(self) -> None:
+    image = filling.create_background(
+      types.ImageParameters(width=4, height=2, background_color=_RED),
+      types.FillParameters(),
+    )
+
+    self.assertEqual(image.mode, 'RGB')
+    self.assertEqual(image.size, (4, 2))
+    self.assertEqual(image.getcolors(), [(8, (255, 0, 0))])
+
+  @unittest.skipUnless(
+    importlib.util.find_spec('numpy') is not None,
+    'the numpy package is not installed',
+  )
+  def test_horizontal(self) -> None:
+    image = filling.create_background(
+      types.ImageParameters(width=3, height=2, background_color=_RED),
+      types.FillParameters(type=types.FillType.HORIZONTAL, second_color=_BLUE),
+    )
+
+    self.assertEqual(image.size, (3, 2))
+    for y in range(2):
+      self.assertEqual(
+        [image.getpixel((x, y)) for x in range(3)],
+        [(255, 0, 0), (128, 0, 128), (0, 0, 255)],
+      )
+
+  @unittest.skipUnless(
+    importlib.util.find_spec('numpy') is not None,
+    'the numpy package is not installed',
+  )
+  def test_vertical(self) -> None:
+    image = filling.create_background(
+      types.ImageParameters(width=2, height=3, background_color=_RED),
+      types.FillParameters(type=types.FillType.VERTICAL, second_color=_BLUE),
+    )
+
+    self.assertEqual(
+      [image.getpixel((0, y)) for y in range(3)],
+      [(255, 0, 0), (128, 0, 128), (0, 0, 255)],
+    )
+
+  @unittest.skipUnless(
+    importlib.util.find_spec('numpy') is not None,
+    'the numpy package is not installed',
+  )
+  def test_radial(self) -> None:
+    image = filling.create_background(
+      types.ImageParameters(width=3, height=3, background_color=_RED),
+      types.FillParameters(type=types.FillType.RADIAL, second_color=_BLUE),
+    )
+
+    self.assertEqual(image.getpixel((1, 1)), (255, 0, 0))
+    self.assertEqual(image.getpixel((0, 0)), (0, 0, 255))
+    self.assertEqual(image.getpixel((2, 2)), (0, 0, 255))
+
+  @unittest.skipUnless(
+    importlib.util.find_spec('numpy') is not None,
+    'the numpy package is not installed',
+  )
+  def test_checkerboard(self) -> None:
+    image = filling.create_background(
+      types.ImageParameters(width=4, height=4, background_color=_RED),
+      types.FillParameters(
+        type=types.FillType.CHECKERBOARD,
+        second_color=_BLUE,
+        pattern_size=2,
+      ),
+    )
+
+    self.assertEqual(image.getpixel((1, 1)), (255, 0, 0))
+    self.assertEqual(image.getpixel((2, 1)), (0, 0, 255))
+    self.assertEqual(image.getpixel((1, 2)), (0, 0, 255))
+    self.assertEqual(image.getpixel((3, 3)), (255, 0, 0))
+
+  @unittest.skipUnless(
+    importlib.util.find_spec('numpy') is not None,
+    'the numpy package is not installed',
+  )
+  def test_stripes(self) -> None:
+    image = filling.create_background(
+      types.ImageParameters(width=4, height=1, background_color=_RED),
+      types.FillParameters(
+        type=types.FillType.STRIPES,
+        second_color=_BLUE,
+        pattern_size=2,
+      ),
+    )
+
+    self.assertEqual(
+      [image.getpixel((x, 0)) for x in range(4)],
+      [(255, 0, 0), (255, 0, 0), (0, 0, 255), (0, 0, 255)],
+    )
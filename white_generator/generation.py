@@ -1,87 +1,632 @@
+import os
+import math
+import time
+import random
+import hashlib
 import pathlib
+import itertools
+import functools
 import dataclasses
+import concurrent.futures
+import typing
+from io import BytesIO
 
 from PIL import Image
 from PIL import ImageDraw
 from PIL import ImageFont
 
+from . import io
 from . import text
 from . import types
+from . import profiling
+from . import filling
+from . import cache
+
+DEFAULT_CHUNK_SIZE = 8
+# the number of pending tasks per process, which keeps the processes busy
+# and limits the memory usage
+TASKS_PER_JOB = 4
+
+_FONT_POOL_SIZE = 256
+_FONT_DATA_POOL_SIZE = 16
+_BACKGROUND_CACHE_SIZE = 8
+# the images are reduced by the integer factors until they are this many
+# times larger than the target size, and then they are resampled
+_REDUCING_GAP = 3.0
+
+_Font: typing.TypeAlias = ImageFont.FreeTypeFont | ImageFont.ImageFont
+_FontKey: typing.TypeAlias = tuple[str | None, int, int]
+_BackgroundKey: typing.TypeAlias = \
+    tuple[str, tuple[int, int], Image.Resampling, bool]
+_GeneratedImage: typing.TypeAlias = Image.Image | bytes
+_GeneratedChunk: typing.TypeAlias = \
+    tuple[list[_GeneratedImage], dict[str, list[float]]]
+_TaskKey = typing.TypeVar('_TaskKey')
+_TaskArgument = typing.TypeVar('_TaskArgument')
+_TaskResult = typing.TypeVar('_TaskResult')
+
+# the fonts are shared by all renderers of a process
+font_pool: cache.LRUCache[_FontKey, _Font] = cache.LRUCache(_FONT_POOL_SIZE)
+# the decoded backgrounds are shared by all renderers of a process too;
+# they are only copied for the notes, so they stay unchanged
+background_cache: cache.LRUCache[_BackgroundKey, Image.Image] = \
+    cache.LRUCache(_BACKGROUND_CACHE_SIZE)
+# the font data is kept only for the recently used files, the fonts
+# of the pool keep their data themselves
+font_data_pool: cache.LRUCache[str, bytes] = \
+    cache.LRUCache(_FONT_DATA_POOL_SIZE)
+
+class Renderer:
+    def __init__(
+        self,
+        image_parameters: types.ImageParameters,
+        text_parameters: types.TextParameters,
+        watermark_parameters: types.WatermarkParameters,
+        fill_parameters: types.FillParameters | None = None,
+    ) -> None:
+        if fill_parameters is None:
+            fill_parameters = types.FillParameters()
+
+        # the background is created once and copied for each note
+        (self._background, self.image_parameters) = \
+            _load_background(image_parameters, fill_parameters)
+
+        # the backgrounds from the directory are decoded on demand,
+        # and only the recently used ones are kept
+        self._background_files: list[pathlib.Path] = []
+        if image_parameters.background_directory is not None:
+            self._background_files = \
+                find_background_files(image_parameters.background_directory)
+            if not self._background_files:
+                raise ValueError(
+                    'no background images in the directory '
+                        + str(image_parameters.background_directory),
+                )
+        self.background_cache: cache.LRUCache[pathlib.Path, Image.Image] = \
+            cache.LRUCache(image_parameters.background_cache_size)
+
+        self._text_font = \
+            load_font(text_parameters.font.file, text_parameters.font.size)
+        self._unfitted_text_parameters = text_parameters
+        with profiling.profiler.measure('rectangle_fitting'):
+            self.text_parameters = dataclasses.replace(
+                text_parameters,
+                rectangle=text.fit_text_rectangle(
+                    self.image_parameters,
+                    text_parameters,
+                    self._text_font,
+                ),
+            )
+
+        self.watermark_parameters = watermark_parameters
+        # the watermark doesn't depend on a note, so it's rendered once
+        # and only pasted for each note
+        self._watermark_layer: tuple[Image.Image, tuple[int, int]] | None = None
+        if watermark_parameters.text is not None:
+            self._watermark_layer = _render_text_watermark(
+                self.image_parameters,
+                watermark_parameters,
+                load_font(text_parameters.font.file, watermark_parameters.size),
+            )
+        elif watermark_parameters.image is not None:
+            self._watermark_layer = _load_image_watermark(
+                self.image_parameters,
+                watermark_parameters.image,
+            )
+
+    def render(self, note: str) -> Image.Image:
+        image = self._get_background(note).copy()
+
+        draw = ImageDraw.Draw(image)
+        with profiling.profiler.measure('wrapping'):
+            if self.text_parameters.font.size_auto is None:
+                (text_font, text_parameters) = \
+                    (self._text_font, self.text_parameters)
+                fitted_note = \
+                    text.fit_text(draw, note, text_parameters, text_font)
+            else:
+                (text_font, text_parameters, fitted_note) = text.fit_font_size(
+                    draw,
+                    note,
+                    self.image_parameters,
+                    self._unfitted_text_parameters,
+                    self._get_text_font,
+                )
+
+        with profiling.profiler.measure('drawing'):
+            draw.multiline_text(
+                text.get_text_position(
+                    draw,
+                    fitted_note,
+                    text_parameters,
+                    text_font,
+                ),
+                fitted_note,
+                align=text_parameters.horizontal_align,
+                font=text_font,
+                fill=tuple(text_parameters.font.color),
+            )
+
+            if self._watermark_layer is not None:
+                (watermark, watermark_position) = self._watermark_layer
+                image.paste(watermark, watermark_position, watermark)
+
+        return image
+
+    def _get_background(self, note: str) -> Image.Image:
+        if not self._background_files:
+            return self._background
+
+        if self.image_parameters.background_choice \
+            == types.BackgroundChoice.RANDOM:
+            background_file = random.choice(self._background_files)
+        else:
+            # the hash is stable between runs unlike the built-in one
+            note_hash = hashlib.blake2b(note.encode(), digest_size=8).digest()
+            background_file = self._background_files[
+                int.from_bytes(note_hash, 'big') % len(self._background_files)
+            ]
+
+        return self.background_cache.get(
+            background_file,
+            lambda: _decode_background_image(dataclasses.replace(
+                self.image_parameters,
+                background_image=background_file,
+            )),
+        )
+
+    def _get_text_font(
+        self,
+        font_size: int,
+    ) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+        # the fonts of the automatic size selection are kept by the font pool
+        return load_font(self.text_parameters.font.file, font_size)
+
+@dataclasses.dataclass
+class EncodedImage:
+    data: bytes
+    encoding_time: float
+    # the stage times measured in a worker process for the profiling
+    stage_times: dict[str, list[float]] = dataclasses.field(default_factory=dict)
+    # the background cache counts of a worker process since its previous image
+    background_cache_hits: int = 0
+    background_cache_misses: int = 0
+
+@dataclasses.dataclass
+class RenderedImage:
+    image: Image.Image
+    # the stage times measured in a worker process for the profiling
+    stage_times: dict[str, list[float]] = dataclasses.field(default_factory=dict)
+    # the background cache counts of a worker process since its previous image
+    background_cache_hits: int = 0
+    background_cache_misses: int = 0
+
+_worker_renderer: Renderer | None = None
+_worker_encoding_parameters: types.EncodingParameters | None = None
 
 def generate_image(
     note: str,
     image_parameters: types.ImageParameters,
     text_parameters: types.TextParameters,
     watermark_parameters: types.WatermarkParameters,
+    fill_parameters: types.FillParameters | None = None,
 ) -> Image.Image:
-    updated_image_parameters = image_parameters
-    if image_parameters.background_image is None:
-        image = Image.new(
-            'RGB',
-            image_parameters.size,
-            tuple(image_parameters.background_color),
-        )
-    else:
-        image = Image.open(image_parameters.background_image)
+    renderer = Renderer(
+        image_parameters,
+        text_parameters,
+        watermark_parameters,
+        fill_parameters,
+    )
+    return renderer.render(note)
 
-        if not image_parameters.no_resizing \
-            and image.size != image_parameters.size:
-            image = image.resize(
-                image_parameters.size,
-                image_parameters.resizing_filter,
-            )
-        else:
-            (image_width, image_height) = image.size
-            updated_image_parameters = dataclasses.replace(
-                image_parameters,
-                width=image_width,
-                height=image_height,
-            )
+def generate_images(
+    notes: typing.Iterable[str],
+    image_parameters: types.ImageParameters,
+    text_parameters: types.TextParameters,
+    watermark_parameters: types.WatermarkParameters,
+    fill_parameters: types.FillParameters | None = None,
+    *,
+    encoding_parameters: types.EncodingParameters | None = None,
+    jobs: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ordered: bool = True,
+) -> typing.Iterator[tuple[str, Image.Image | bytes]]:
+    # the arguments are checked on the call, not on the first iteration
+    if chunk_size <= 0:
+        raise ValueError(f'the chunk size must be positive: {chunk_size}')
 
-    text_font = load_font(text_parameters.font.file, text_parameters.font.size)
-    updated_text_parameters = dataclasses.replace(
+    return _generate_images(
+        notes,
+        image_parameters,
         text_parameters,
-        rectangle=text.fit_text_rectangle(
-            updated_image_parameters,
-            text_parameters,
-            text_font,
+        watermark_parameters,
+        fill_parameters or types.FillParameters(),
+        encoding_parameters,
+        jobs,
+        chunk_size,
+        ordered,
+    )
+
+def run_in_workers(
+    executor: concurrent.futures.Executor,
+    worker_function: typing.Callable[[_TaskArgument], _TaskResult],
+    tasks: typing.Iterable[tuple[_TaskKey, _TaskArgument]],
+    max_pending_tasks: int,
+    ordered: bool = False,
+) -> typing.Iterator[tuple[_TaskKey, concurrent.futures.Future[_TaskResult]]]:
+    # the done tasks are returned with their keys, and their errors
+    # are handled by the caller
+    pending_tasks: dict[concurrent.futures.Future[_TaskResult], _TaskKey] = {}
+    for key, argument in tasks:
+        # limit the number of pending tasks to keep the memory usage flat
+        if len(pending_tasks) >= max_pending_tasks:
+            # in the ordered mode, the oldest task is awaited,
+            # since the later ones can't be popped before it
+            concurrent.futures.wait(
+                [next(iter(pending_tasks))] if ordered else pending_tasks,
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            yield from _pop_done_tasks(pending_tasks, ordered)
+
+        try:
+            task = executor.submit(worker_function, argument)
+        except concurrent.futures.BrokenExecutor as exception:
+            # the broken executor fails all its pending tasks,
+            # and the unsubmitted one is returned failed like them
+            task = concurrent.futures.Future()
+            task.set_exception(exception)
+            pending_tasks[task] = key
+            break
+
+        pending_tasks[task] = key
+
+    concurrent.futures.wait(pending_tasks)
+    yield from _pop_done_tasks(pending_tasks, ordered)
+
+def load_font(
+    font_file: pathlib.Path | None,
+    font_size: int,
+    font_index: int = 0,
+) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    font_path = os.path.realpath(font_file) if font_file is not None else None
+    return font_pool.get(
+        (font_path, font_size, font_index),
+        lambda: _load_font(font_path, font_size, font_index),
+    )
+
+def load_background_image(image_parameters: types.ImageParameters) -> Image.Image:
+    assert image_parameters.background_image is not None
+
+    return background_cache.get(
+        (
+            os.path.realpath(image_parameters.background_image),
+            image_parameters.size,
+            image_parameters.resizing_filter,
+            image_parameters.no_resizing,
         ),
+        lambda: _decode_background_image(image_parameters),
     )
 
-    draw = ImageDraw.Draw(image)
-    fitted_note = text.fit_text(draw, note, updated_text_parameters, text_font)
-    draw.multiline_text(
-        text.get_text_position(draw, fitted_note, updated_text_parameters, text_font),
-        fitted_note,
-        align=updated_text_parameters.horizontal_align,
-        font=text_font,
-        fill=tuple(updated_text_parameters.font.color),
+def find_background_files(background_directory: pathlib.Path) -> list[pathlib.Path]:
+    # the files are sorted to choose the same background for a note
+    # between runs
+    extensions = Image.registered_extensions()
+    return sorted(
+        path
+        for path in background_directory.iterdir()
+        if path.is_file() and path.suffix.lower() in extensions
     )
 
-    if watermark_parameters.text is not None:
-        watermark_font = load_font(
-            updated_text_parameters.font.file,
-            watermark_parameters.size,
+def encode_image(
+    image: Image.Image,
+    encoding_parameters: types.EncodingParameters | None = None,
+) -> bytes:
+    if encoding_parameters is None:
+        encoding_parameters = types.EncodingParameters()
+
+    if encoding_parameters.quantize:
+        # the palette mode is effective for solid backgrounds and flat text
+        image = image.quantize()
+    elif encoding_parameters.format == types.ImageFormat.JPEG \
+        and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+
+    options: dict[str, int | bool] = {}
+    if encoding_parameters.compress_level is not None:
+        options['compress_level'] = encoding_parameters.compress_level
+    if encoding_parameters.quality is not None:
+        options['quality'] = encoding_parameters.quality
+    if encoding_parameters.optimize:
+        options['optimize'] = True
+
+    image_buffer = BytesIO()
+    image.save(image_buffer, encoding_parameters.format.value.upper(), **options)
+
+    return image_buffer.getvalue()
+
+def encode_image_with_timing(
+    image: Image.Image,
+    encoding_parameters: types.EncodingParameters,
+) -> EncodedImage:
+    start_time = time.perf_counter()
+    with profiling.profiler.measure('encoding'):
+        image_data = encode_image(image, encoding_parameters)
+
+    return EncodedImage(image_data, time.perf_counter() - start_time)
+
+def init_worker(
+    image_parameters: types.ImageParameters,
+    text_parameters: types.TextParameters,
+    watermark_parameters: types.WatermarkParameters,
+    encoding_parameters: types.EncodingParameters,
+    fill_parameters: types.FillParameters | None = None,
+    profile: bool = False,
+) -> None:
+    global _worker_renderer, _worker_encoding_parameters
+    profiling.profiler.enabled = profile
+    # drop the stage times inherited from the main process on forking
+    profiling.profiler.pop_stage_times()
+    _worker_renderer = Renderer(
+        image_parameters,
+        text_parameters,
+        watermark_parameters,
+        fill_parameters,
+    )
+    _worker_encoding_parameters = encoding_parameters
+
+def generate_image_in_worker(note: str) -> EncodedImage:
+    assert _worker_renderer is not None
+    assert _worker_encoding_parameters is not None
+
+    image = _worker_renderer.render(note)
+    encoded_image = encode_image_with_timing(image, _worker_encoding_parameters)
+    image.close()
+    # the worker's stage times are passed to the main process with each image
+    encoded_image.stage_times = profiling.profiler.pop_stage_times()
+    (
+        encoded_image.background_cache_hits,
+        encoded_image.background_cache_misses,
+    ) = _pop_background_cache_counts(_worker_renderer)
+
+    return encoded_image
+
+def render_image_in_worker(note: str) -> RenderedImage:
+    assert _worker_renderer is not None
+
+    image = _worker_renderer.render(note)
+    return RenderedImage(
+        image,
+        profiling.profiler.pop_stage_times(),
+        *_pop_background_cache_counts(_worker_renderer),
+    )
+
+def _pop_background_cache_counts(renderer: Renderer) -> tuple[int, int]:
+    # the counts are reset, but the cached backgrounds are kept
+    counts = (renderer.background_cache.hits, renderer.background_cache.misses)
+    renderer.background_cache.hits = 0
+    renderer.background_cache.misses = 0
+
+    return counts
+
+def _generate_images(
+    notes: typing.Iterable[str],
+    image_parameters: types.ImageParameters,
+    text_parameters: types.TextParameters,
+    watermark_parameters: types.WatermarkParameters,
+    fill_parameters: types.FillParameters,
+    encoding_parameters: types.EncodingParameters | None,
+    jobs: int,
+    chunk_size: int,
+    ordered: bool,
+) -> typing.Iterator[tuple[str, _GeneratedImage]]:
+    namespace = io.generate_namespace(
+        image_parameters,
+        fill_parameters,
+        text_parameters,
+        watermark_parameters,
+        encoding_parameters or types.EncodingParameters(),
+    )
+    identified_notes = \
+        ((io.generate_note_id(note, namespace), note) for note in notes)
+    # the images are encoded only if the encoding parameters are passed
+    if jobs <= 1:
+        renderer = Renderer(
+            image_parameters,
+            text_parameters,
+            watermark_parameters,
+            fill_parameters,
         )
-        draw.multiline_text(
-            text.get_watermark_position(
-                draw,
-                watermark_parameters.text,
-                updated_image_parameters,
-                watermark_font,
-            ),
-            watermark_parameters.text,
-            font=watermark_font,
-            fill=tuple(watermark_parameters.color),
+        for note_id, note in identified_notes:
+            yield (note_id, _generate_image(renderer, note, encoding_parameters))
+
+        return
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_worker,
+        initargs=(
+            image_parameters,
+            text_parameters,
+            watermark_parameters,
+            encoding_parameters or types.EncodingParameters(),
+            fill_parameters,
+            profiling.profiler.enabled,
+        ),
+    )
+    # the pending chunks are cancelled if the iteration is stopped early
+    try:
+        chunks = iter(
+            lambda: list(itertools.islice(identified_notes, chunk_size)),
+            [],
         )
+        for note_ids, task in run_in_workers(
+            executor,
+            functools.partial(
+                _generate_chunk_in_worker,
+                encoded=encoding_parameters is not None,
+            ),
+            (
+                ([note_id for note_id, _ in chunk], [note for _, note in chunk])
+                for chunk in chunks
+            ),
+            jobs * TASKS_PER_JOB,
+            ordered,
+        ):
+            (images, stage_times) = task.result()
+            profiling.profiler.add(stage_times)
+            yield from zip(note_ids, images)
+    finally:
+        executor.shutdown(cancel_futures=True)
 
-    return image
+def _generate_image(
+    renderer: Renderer,
+    note: str,
+    encoding_parameters: types.EncodingParameters | None,
+) -> _GeneratedImage:
+    image = renderer.render(note)
+    if encoding_parameters is None:
+        return image
 
-def load_font(
-    font_file: pathlib.Path | None,
+    image_data = encode_image_with_timing(image, encoding_parameters).data
+    image.close()
+
+    return image_data
+
+def _generate_chunk_in_worker(notes: list[str], encoded: bool) -> _GeneratedChunk:
+    assert _worker_renderer is not None
+    assert _worker_encoding_parameters is not None
+
+    encoding_parameters = _worker_encoding_parameters if encoded else None
+    images = [
+        _generate_image(_worker_renderer, note, encoding_parameters)
+        for note in notes
+    ]
+    # the worker's stage times are passed to the main process with each chunk
+    return (images, profiling.profiler.pop_stage_times())
+
+def _pop_done_tasks(
+    pending_tasks: dict[concurrent.futures.Future[_TaskResult], _TaskKey],
+    ordered: bool,
+) -> typing.Iterator[tuple[_TaskKey, concurrent.futures.Future[_TaskResult]]]:
+    # the pending tasks are kept in the order of their submitting
+    done_tasks = list(
+        itertools.takewhile(lambda task: task.done(), pending_tasks)
+            if ordered
+            else filter(lambda task: task.done(), pending_tasks)
+    )
+    for task in done_tasks:
+        yield (pending_tasks.pop(task), task)
+
+def _load_font(
+    font_path: str | None,
     font_size: int,
+    font_index: int,
 ) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
-    if font_file is None:
-        return ImageFont.load_default(font_size)
+    with profiling.profiler.measure('font_loading'):
+        if font_path is None:
+            return ImageFont.load_default(font_size)
+
+        # the font file is read once and its data is shared by all sizes:
+        # a bytes stream returns its initial bytes without copying them
+        # on a full read, and the font keeps them
+        font_data = font_data_pool.get(
+            font_path,
+            lambda: pathlib.Path(font_path).read_bytes(),
+        )
+        return ImageFont.truetype(BytesIO(font_data), font_size, font_index)
+
+def _render_text_watermark(
+    image_parameters: types.ImageParameters,
+    watermark_parameters: types.WatermarkParameters,
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+) -> tuple[Image.Image, tuple[int, int]] | None:
+    assert watermark_parameters.text is not None
+
+    # the glyph coverage is drawn to a mask, which becomes the layer alpha,
+    # so the pasting blends the text as the drawing on the image does
+    mask = Image.new('L', image_parameters.size)
+    draw = ImageDraw.Draw(mask)
+    draw.multiline_text(
+        text.get_watermark_position(
+            draw,
+            watermark_parameters.text,
+            image_parameters,
+            font,
+        ),
+        watermark_parameters.text,
+        font=font,
+        fill=255,
+    )
+    mask_box = mask.getbbox()
+    if mask_box is None:
+        return None
+
+    (red, green, blue, *_) = tuple(watermark_parameters.color)
+    watermark = Image.new(
+        'RGBA',
+        (mask_box[2] - mask_box[0], mask_box[3] - mask_box[1]),
+        (red, green, blue),
+    )
+    watermark.putalpha(mask.crop(mask_box))
+    return (watermark, (mask_box[0], mask_box[1]))
+
+def _load_image_watermark(
+    image_parameters: types.ImageParameters,
+    watermark_image: pathlib.Path,
+) -> tuple[Image.Image, tuple[int, int]]:
+    with Image.open(watermark_image) as image:
+        watermark = image.convert('RGBA')
 
-    return ImageFont.truetype(font_file, font_size)
+    # the image is placed in the bottom right corner like the text
+    (watermark_width, watermark_height) = watermark.size
+    return (
+        watermark,
+        (
+            image_parameters.width - watermark_width,
+            image_parameters.height - watermark_height,
+        ),
+    )
+
+def _load_background(
+    image_parameters: types.ImageParameters,
+    fill_parameters: types.FillParameters,
+) -> tuple[Image.Image, types.ImageParameters]:
+    if image_parameters.background_image is None:
+        image = filling.create_background(image_parameters, fill_parameters)
+        return (image, image_parameters)
+
+    image = load_background_image(image_parameters)
+    if not image_parameters.no_resizing:
+        return (image, image_parameters)
+
+    (image_width, image_height) = image.size
+    updated_image_parameters = dataclasses.replace(
+        image_parameters,
+        width=image_width,
+        height=image_height,
+    )
+    return (image, updated_image_parameters)
+
+def _decode_background_image(
+    image_parameters: types.ImageParameters,
+) -> Image.Image:
+    assert image_parameters.background_image is not None
+
+    with profiling.profiler.measure('background_loading'):
+        image = Image.open(image_parameters.background_image)
+        if image_parameters.no_resizing or image.size == image_parameters.size:
+            # the copying loads the image and closes its file
+            return image.copy()
+
+        # JPEG images are decoded at once at a reduced scale (1/2, 1/4
+        # or 1/8), which is still large enough for the high-quality resizing
+        (width, height) = image_parameters.size
+        image.draft(None, (
+            math.ceil(width * _REDUCING_GAP),
+            math.ceil(height * _REDUCING_GAP),
+        ))
+        return image.resize(
+            image_parameters.size,
+            image_parameters.resizing_filter,
+            reducing_gap=_REDUCING_GAP,
+        )
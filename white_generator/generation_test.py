@@ -0,0 +1,416 @@
+import io
+import unittest
+import tempfile
+import pathlib
+
+from PIL import Image
+from PIL import ImageChops
+from PIL import ImageDraw
+from PIL import ImageFont
+from PIL import ImageStat
+
+from . import generation
+from . import types
+from . import text
+
+_RESOURCES_PATH = pathlib.Path(__file__).parent.parent / 'resources'
+
+class TestRenderer(unittest.TestCase):
+  def setUp(self) -> None:
+    self.image_parameters = types.ImageParameters(
+      width=320,
+      height=240,
+      background_image=_RESOURCES_PATH / 'background' / 'clouds.jpg',
+    )
+    self.text_parameters = types.TextParameters(
+      font=types.FontParameters(file=_RESOURCES_PATH / 'font' / 'Kalam-Regular.ttf'),
+    )
+    self.watermark_parameters = types.WatermarkParameters(text='watermark')
+
+  def test_render_matches_generate_image(self) -> None:
+    renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+    image = renderer.render('note #1')
+
+    expected_image = generation.generate_image(
+      'note #1',
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+    self.assertEqual(image.size, (320, 240))
+    self.assertEqual(image.tobytes(), expected_image.tobytes())
+
+  def test_render_does_not_change_background(self) -> None:
+    renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+    first_image = renderer.render('note #1')
+    renderer.render('note #2')
+    second_image = renderer.render('note #1')
+
+    self.assertEqual(first_image.tobytes(), second_image.tobytes())
+
+  def test_render_without_resizing(self) -> None:
+    self.image_parameters.no_resizing = True
+
+    renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+    image = renderer.render('note #1')
+
+    self.assertEqual(image.size, (800, 600))
+    self.assertEqual(renderer.image_parameters.size, (800, 600))
+
+  def test_render_text_watermark(self) -> None:
+    renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+    image = renderer.render('')
+
+    # the pasted watermark layer is the same as the drawn watermark text
+    expected_image = Image \
+      .open(_RESOURCES_PATH / 'background' / 'clouds.jpg') \
+      .resize(self.image_parameters.size, self.image_parameters.resizing_filter)
+    draw = ImageDraw.Draw(expected_image)
+    font = generation.load_font(
+      self.text_parameters.font.file,
+      self.watermark_parameters.size,
+    )
+    draw.multiline_text(
+      text.get_watermark_position(
+        draw,
+        'watermark',
+        self.image_parameters,
+        font,
+      ),
+      'watermark',
+      font=font,
+      fill=tuple(self.watermark_parameters.color),
+    )
+    self.assertEqual(image.tobytes(), expected_image.tobytes())
+
+  def test_render_image_watermark(self) -> None:
+    with tempfile.TemporaryDirectory(prefix='white-generator-') as tmp_dir:
+      watermark_image = pathlib.Path(tmp_dir) / 'logo.png'
+      Image.new('RGBA', (20, 10), (255, 0, 0, 255)).save(watermark_image)
+
+      renderer = generation.Renderer(
+        types.ImageParameters(width=320, height=240),
+        self.text_parameters,
+        types.WatermarkParameters(image=watermark_image),
+      )
+      image = renderer.render('')
+
+    self.assertEqual(image.getpixel((300, 230)), (255, 0, 0))
+    self.assertEqual(image.getpixel((319, 239)), (255, 0, 0))
+    self.assertEqual(image.getpixel((299, 239)), (255, 255, 255))
+    self.assertEqual(image.getpixel((319, 229)), (255, 255, 255))
+
+class TestRendererWithBackgroundDirectory(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.background_directory = pathlib.Path(self._tmpDir.name)
+    for color in ['red', 'green', 'blue']:
+      Image.new('RGB', (320, 240), color).save(self.background_directory / f'{color}.png')
+    (self.background_directory / 'notes.txt').write_text('note')
+
+    self.image_parameters = types.ImageParameters(
+      width=320,
+      height=240,
+      background_directory=self.background_directory,
+      background_cache_size=2,
+    )
+    self.text_parameters = types.TextParameters()
+    self.watermark_parameters = types.WatermarkParameters()
+
+  def tearDown(self) -> None:
+    self._tmpDir.cleanup()
+
+  def test_find_background_files(self) -> None:
+    background_files = generation.find_background_files(self.background_directory)
+
+    self.assertEqual(
+      [background_file.name for background_file in background_files],
+      ['blue.png', 'green.png', 'red.png'],
+    )
+
+  def test_hash_choice(self) -> None:
+    renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+    other_renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+
+    background_colors = set()
+    for number in range(20):
+      image = renderer.render(f'note #{number}')
+      other_image = other_renderer.render(f'note #{number}')
+
+      self.assertEqual(image.tobytes(), other_image.tobytes())
+      background_colors.add(image.getpixel((319, 239)))
+    self.assertEqual(
+      background_colors,
+      {(255, 0, 0), (0, 128, 0), (0, 0, 255)},
+    )
+
+  def test_random_choice(self) -> None:
+    self.image_parameters.background_choice = types.BackgroundChoice.RANDOM
+    renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+
+    for _ in range(10):
+      image = renderer.render('note')
+      self.assertIn(
+        image.getpixel((319, 239)),
+        [(255, 0, 0), (0, 128, 0), (0, 0, 255)],
+      )
+
+  def test_background_cache(self) -> None:
+    renderer = generation.Renderer(
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    )
+
+    for _ in range(3):
+      renderer.render('note')
+
+    self.assertEqual(renderer.background_cache.misses, 1)
+    self.assertEqual(renderer.background_cache.hits, 2)
+    self.assertEqual(len(renderer.background_cache), 1)
+
+  def test_empty_directory(self) -> None:
+    for background_file in generation.find_background_files(self.background_directory):
+      background_file.unlink()
+
+    with self.assertRaises(ValueError):
+      generation.Renderer(
+        self.image_parameters,
+        self.text_parameters,
+        self.watermark_parameters,
+      )
+
+class TestGenerateImages(unittest.TestCase):
+  def setUp(self) -> None:
+    self.image_parameters = types.ImageParameters(width=320, height=240)
+    self.text_parameters = types.TextParameters()
+    self.watermark_parameters = types.WatermarkParameters(text='watermark')
+    self.notes = [f'note #{number}' for number in range(5)]
+
+  def test_images(self) -> None:
+    images = list(generation.generate_images(
+      self.notes,
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+    ))
+
+    self.assertEqual(len(images), 5)
+    self.assertEqual(len({note_id for note_id, _ in images}), 5)
+    for note, (_, image) in zip(self.notes, images):
+      expected_image = generation.generate_image(
+        note,
+        self.image_parameters,
+        self.text_parameters,
+        self.watermark_parameters,
+      )
+      assert isinstance(image, Image.Image)
+      self.assertEqual(image.tobytes(), expected_image.tobytes())
+
+  def test_encoded_images(self) -> None:
+    images = list(generation.generate_images(
+      self.notes,
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+      encoding_parameters=types.EncodingParameters(format=types.ImageFormat.JPEG),
+    ))
+
+    for _, image_data in images:
+      assert isinstance(image_data, bytes)
+      self.assertEqual(Image.open(io.BytesIO(image_data)).format, 'JPEG')
+
+  def test_parallel_generation(self) -> None:
+    expected_images = list(generation.generate_images(
+      self.notes,
+      self.image_parameters,
+      self.text_parameters,
+      self.watermark_parameters,
+      encoding_parameters=types.EncodingParameters(),
+    ))
+
+    for ordered in [True, False]:
+      with self.subTest(ordered=ordered):
+        images = list(generation.generate_images(
+          self.notes,
+          self.image_parameters,
+          self.text_parameters,
+          self.watermark_parameters,
+          encoding_parameters=types.EncodingParameters(),
+          jobs=2,
+          chunk_size=2,
+          ordered=ordered,
+        ))
+
+        if ordered:
+          self.assertEqual(images, expected_images)
+        else:
+          self.assertCountEqual(images, expected_images)
+
+  def test_invalid_chunk_size(self) -> None:
+    with self.assertRaises(ValueError):
+      generation.generate_images(
+        self.notes,
+        self.image_parameters,
+        self.text_parameters,
+        self.watermark_parameters,
+        chunk_size=0,
+      )
+
+class TestLoadFont(unittest.TestCase):
+  def setUp(self) -> None:
+    self.font_file = _RESOURCES_PATH / 'font' / 'Kalam-Regular.ttf'
+    generation.font_pool.clear()
+    generation.font_data_pool.clear()
+
+  def test_same_font(self) -> None:
+    font = generation.load_font(self.font_file, 25)
+    other_font = generation.load_font(self.font_file, 25)
+
+    self.assertIs(font, other_font)
+    self.assertEqual(generation.font_pool.misses, 1)
+    self.assertEqual(generation.font_pool.hits, 1)
+
+  def test_different_sizes(self) -> None:
+    font = generation.load_font(self.font_file, 25)
+    other_font = generation.load_font(self.font_file, 50)
+
+    self.assertIsNot(font, other_font)
+    self.assertEqual(getattr(font, 'size'), 25)
+    self.assertEqual(getattr(other_font, 'size'), 50)
+    # the font data is shared by all sizes
+    self.assertIs(getattr(font, 'font_bytes'), getattr(other_font, 'font_bytes'))
+    self.assertEqual(generation.font_data_pool.misses, 1)
+
+  def test_font_metrics(self) -> None:
+    font = generation.load_font(self.font_file, 25)
+
+    assert isinstance(font, ImageFont.FreeTypeFont)
+    self.assertEqual(
+      font.getmetrics(),
+      ImageFont.truetype(self.font_file, 25).getmetrics(),
+    )
+
+  def test_default_font(self) -> None:
+    font = generation.load_font(None, 25)
+
+    self.assertIs(generation.load_font(None, 25), font)
+
+class TestLoadBackgroundImage(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.background_image = pathlib.Path(self._tmpDir.name) / 'background.jpg'
+    Image.open(_RESOURCES_PATH / 'background' / 'clouds.jpg') \
+      .resize((3200, 2400)) \
+      .save(self.background_image)
+
+    generation.background_cache.clear()
+
+  def tearDown(self) -> None:
+    self._tmpDir.cleanup()
+
+  def test_same_background(self) -> None:
+    image_parameters = types.ImageParameters(
+      background_image=self.background_image,
+    )
+
+    image = generation.load_background_image(image_parameters)
+    other_image = generation.load_background_image(image_parameters)
+
+    self.assertIs(image, other_image)
+    self.assertEqual(generation.background_cache.misses, 1)
+    self.assertEqual(generation.background_cache.hits, 1)
+
+  def test_reduced_decoding(self) -> None:
+    image_parameters = types.ImageParameters(
+      width=320,
+      height=240,
+      background_image=self.background_image,
+    )
+
+    image = generation.load_background_image(image_parameters)
+
+    expected_image = Image.open(self.background_image) \
+      .resize(image_parameters.size, image_parameters.resizing_filter)
+    self.assertEqual(image.size, (320, 240))
+    for channel in ImageStat.Stat(ImageChops.difference(image, expected_image)).mean:
+      self.assertLess(channel, 1.0)
+
+  def test_without_resizing(self) -> None:
+    image_parameters = types.ImageParameters(
+      background_image=self.background_image,
+      no_resizing=True,
+    )
+
+    image = generation.load_background_image(image_parameters)
+
+    self.assertEqual(image.size, (3200, 2400))
+
+class TestEncodeImage(unittest.TestCase):
+  def setUp(self) -> None:
+    self.image = generation.generate_image(
+      'note #1',
+      types.ImageParameters(width=320, height=240),
+      types.TextParameters(),
+      types.WatermarkParameters(),
+    )
+
+  def test_default_parameters(self) -> None:
+    image_data = generation.encode_image(self.image)
+
+    image_buffer = io.BytesIO()
+    self.image.save(image_buffer, 'PNG')
+    self.assertEqual(image_data, image_buffer.getvalue())
+
+  def test_formats(self) -> None:
+    for image_format in types.ImageFormat:
+      if not image_format.is_supported:
+        continue
+
+      with self.subTest(image_format=image_format):
+        image_data = generation.encode_image(
+          self.image,
+          types.EncodingParameters(format=image_format, quality=80),
+        )
+
+        decoded_image = Image.open(io.BytesIO(image_data))
+        self.assertEqual(decoded_image.format, image_format.value.upper())
+        self.assertEqual(decoded_image.size, (320, 240))
+
+  def test_quantization(self) -> None:
+    image_data = generation.encode_image(
+      self.image,
+      types.EncodingParameters(compress_level=9, optimize=True, quantize=True),
+    )
+
+    decoded_image = Image.open(io.BytesIO(image_data))
+    self.assertEqual(decoded_image.mode, 'P')
+    self.assertLess(len(image_data), len(generation.encode_image(self.image)))
@@ -0,0 +1,114 @@
+import os
+import json
+import pathlib
+import hashlib
+import dataclasses
+
+from . import db
+
+_READING_BLOCK_SIZE = 1 << 20
+
+@dataclasses.dataclass
+class InputState:
+    # the size of the processed part of the notes file and its checksum;
+    # the part ends after a blank line, so an appended line can't continue
+    # the last note of the part
+    offset: int = 0
+    checksum: str = ''
+
+def load_input_state(
+    notes_filename: pathlib.Path,
+    state_file: pathlib.Path | None = None,
+) -> InputState | None:
+    if state_file is None:
+        state_file = db.get_app_dir() / 'incremental.json'
+
+    try:
+        states = json.loads(state_file.read_text())
+        return InputState(**states[_get_state_key(notes_filename)])
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+def save_input_state(
+    notes_filename: pathlib.Path,
+    input_state: InputState,
+    state_file: pathlib.Path | None = None,
+) -> None:
+    if state_file is None:
+        state_file = db.get_app_dir() / 'incremental.json'
+
+    try:
+        states = json.loads(state_file.read_text())
+    except (OSError, ValueError):
+        states = {}
+
+    states[_get_state_key(notes_filename)] = dataclasses.asdict(input_state)
+
+    temporary_state_file = state_file.with_name(state_file.name + '.tmp')
+    temporary_state_file.write_text(json.dumps(states, indent=2))
+    temporary_state_file.replace(state_file)
+
+def scan_notes_file(
+    notes_filename: pathlib.Path,
+    input_state: InputState | None,
+) -> tuple[int, InputState]:
+    # the file is hashed by one pass: the checksum of the processed part
+    # is checked on the way and the hashing continues up to the file end
+    checksum = hashlib.blake2b()
+    resuming_offset = 0
+    file_size = 0
+    # the end of the last blank line and the checksum of the file before it
+    note_boundary = 0
+    note_boundary_checksum = checksum.copy()
+    # whether the unfinished line read so far is blank
+    is_blank_line = True
+    with open(notes_filename, 'rb') as notes_file:
+        while block := notes_file.read(_get_block_size(file_size, input_state)):
+            block_boundary = _find_note_boundary(block, is_blank_line)
+            if block_boundary is not None:
+                checksum.update(block[:block_boundary])
+                note_boundary = file_size + block_boundary
+                note_boundary_checksum = checksum.copy()
+                checksum.update(block[block_boundary:])
+            else:
+                checksum.update(block)
+
+            file_size += len(block)
+            last_line_start = block.rfind(b'\n') + 1
+            is_blank_line = block[last_line_start:].strip() == b'' \
+                and (is_blank_line or last_line_start != 0)
+
+            if input_state is not None and file_size == input_state.offset:
+                if checksum.hexdigest() == input_state.checksum:
+                    resuming_offset = file_size
+
+    # the notes appended during the run and the last note without a blank
+    # line after it are read again on the next run
+    return (
+        resuming_offset,
+        InputState(note_boundary, note_boundary_checksum.hexdigest()),
+    )
+
+def _find_note_boundary(block: bytes, is_blank_line: bool) -> int | None:
+    # the lines are checked from the block end, so usually only a few ones;
+    # the first line of the block may continue the previous block
+    line_end = block.rfind(b'\n')
+    while line_end != -1:
+        line_start = block.rfind(b'\n', 0, line_end) + 1
+        if block[line_start:line_end].strip() == b'' \
+            and (is_blank_line or line_start != 0):
+            return line_end + 1
+
+        line_end = line_start - 1
+
+    return None
+
+def _get_block_size(file_size: int, input_state: InputState | None) -> int:
+    # the block is shortened to stop exactly at the processed part end
+    if input_state is not None and file_size < input_state.offset:
+        return min(_READING_BLOCK_SIZE, input_state.offset - file_size)
+
+    return _READING_BLOCK_SIZE
+
+def _get_state_key(notes_filename: pathlib.Path) -> str:
+    return os.path.realpath(notes_filename)
@@ -0,0 +1,128 @@
+import unittest
+import unittest.mock
+import tempfile
+import pathlib
+
+from . import incremental
+from . import io
+
+class TestIncremental(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.notes_filename = pathlib.Path(self._tmpDir.name) / 'notes.txt'
+    self.state_file = pathlib.Path(self._tmpDir.name) / 'incremental.json'
+
+  def tearDown(self) -> None:
+    self._tmpDir.cleanup()
+
+  def test_first_scan(self) -> None:
+    self.notes_filename.write_bytes(b'note #1\n\nnote #2')
+
+    (offset, input_state) = incremental.scan_notes_file(self.notes_filename, None)
+
+    self.assertEqual(offset, 0)
+    self.assertEqual(input_state.offset, 9)
+
+  def test_unchanged_file(self) -> None:
+    self.notes_filename.write_bytes(b'note #1\n\nnote #2')
+    (_, input_state) = incremental.scan_notes_file(self.notes_filename, None)
+
+    (offset, next_input_state) = \
+      incremental.scan_notes_file(self.notes_filename, input_state)
+
+    self.assertEqual(offset, 9)
+    self.assertEqual(next_input_state, input_state)
+
+  def test_appended_file(self) -> None:
+    self.notes_filename.write_bytes(b'note #1\n\nnote #2')
+    (_, input_state) = incremental.scan_notes_file(self.notes_filename, None)
+
+    with open(self.notes_filename, 'ab') as notes_file:
+      notes_file.write(b'\n\nnote #3')
+    (offset, next_input_state) = \
+      incremental.scan_notes_file(self.notes_filename, input_state)
+
+    self.assertEqual(offset, 9)
+    self.assertEqual(next_input_state.offset, 18)
+    self.assertNotEqual(next_input_state.checksum, input_state.checksum)
+
+  def test_appended_line_of_last_note(self) -> None:
+    self.notes_filename.write_bytes(b'note #1\n\nnote #2 line #1\n')
+    (_, input_state) = incremental.scan_notes_file(self.notes_filename, None)
+
+    with open(self.notes_filename, 'ab') as notes_file:
+      notes_file.write(b'note #2 line #2\n')
+    (offset, _) = incremental.scan_notes_file(self.notes_filename, input_state)
+
+    self.assertEqual(offset, 9)
+    self.assertEqual(
+      list(io.read_notes(self.notes_filename, offset)),
+      ['note #2 line #1\nnote #2 line #2'],
+    )
+
+  def test_blank_line_across_blocks(self) -> None:
+    self.notes_filename.write_bytes(b'note #1\n \r\nnote #2\n')
+
+    with unittest.mock.patch.object(incremental, '_READING_BLOCK_SIZE', 3):
+      (_, input_state) = incremental.scan_notes_file(self.notes_filename, None)
+      (offset, _) = incremental.scan_notes_file(self.notes_filename, input_state)
+
+    self.assertEqual(offset, 11)
+    self.assertEqual(input_state.offset, 11)
+
+  def test_changed_file(self) -> None:
+    self.notes_filename.write_bytes(b'note #1\n\nnote #2')
+    (_, input_state) = incremental.scan_notes_file(self.notes_filename, None)
+
+    self.notes_filename.write_bytes(b'note #0\n\nnote #2\n\nnote #3')
+    (offset, next_input_state) = \
+      incremental.scan_notes_file(self.notes_filename, input_state)
+
+    self.assertEqual(offset, 0)
+    self.assertEqual(next_input_state.offset, 18)
+
+  def test_truncated_file(self) -> None:
+    self.notes_filename.write_bytes(b'note #1\n\nnote #2')
+    (_, input_state) = incremental.scan_notes_file(self.notes_filename, None)
+
+    self.notes_filename.write_bytes(b'note #1')
+    (offset, next_input_state) = \
+      incremental.scan_notes_file(self.notes_filename, input_state)
+
+    self.assertEqual(offset, 0)
+    self.assertEqual(next_input_state.offset, 0)
+
+  def test_saving_and_loading(self) -> None:
+    other_notes_filename = pathlib.Path(self._tmpDir.name) / 'other_notes.txt'
+    input_state = incremental.InputState(16, 'checksum')
+    other_input_state = incremental.InputState(25, 'other checksum')
+
+    incremental.save_input_state(
+      self.notes_filename,
+      input_state,
+      self.state_file,
+    )
+    incremental.save_input_state(
+      other_notes_filename,
+      other_input_state,
+      self.state_file,
+    )
+
+    self.assertEqual(
+      incremental.load_input_state(self.notes_filename, self.state_file),
+      input_state,
+    )
+    self.assertEqual(
+      incremental.load_input_state(other_notes_filename, self.state_file),
+      other_input_state,
+    )
+
+  def test_loading_without_state(self) -> None:
+    self.assertIsNone(
+      incremental.load_input_state(self.notes_filename, self.state_file),
+    )
+
+    self.state_file.write_text('broken')
+    self.assertIsNone(
+      incremental.load_input_state(self.notes_filename, self.state_file),
+    )
@@ -1,26 +1,152 @@
+import io
+import sys
+import json
+import gzip
 import uuid
+import locale
 import pathlib
+import contextlib
 import typing
 
-_UUID_NAMESPACE = uuid.uuid1()
+from . import types
 
-def read_notes(notes_filename: pathlib.Path) -> typing.Iterable[str]:
-    with open(notes_filename) as notes_file:
-        note = ''
-        for line in notes_file:
+STDIN_FILENAME = pathlib.Path('-')
+
+_READING_BUFFER_SIZE = 1 << 20
+
+# the version has to be increased on any change of the parameter fingerprint,
+# since the note IDs depend on it
+_FINGERPRINT_VERSION = 1
+
+_UUID_NAMESPACE = uuid.uuid5(
+    uuid.NAMESPACE_URL,
+    'https://github.com/thewizardplusplus/white-generator',
+)
+
+def read_notes(
+    notes_filename: pathlib.Path,
+    offset: int = 0,
+) -> typing.Iterable[str]:
+    with _open_notes_file(notes_filename) as notes_file:
+        if offset != 0:
+            notes_file.seek(offset)
+
+        yield from parse_notes(notes_file)
+
+def parse_notes(notes_file: typing.BinaryIO) -> typing.Iterator[str]:
+    # the text wrapper decodes the buffered bytes by large chunks
+    # and handles the universal newlines like the text mode of open()
+    notes_text_file = io.TextIOWrapper(
+        notes_file,
+        encoding=locale.getpreferredencoding(False),
+    )
+    try:
+        # the lines are accumulated in a list to avoid repeated concatenation
+        note_lines: list[str] = []
+        for line in notes_text_file:
             stripped_line = line.strip()
             if stripped_line != '':
-                note += stripped_line + '\n'
+                note_lines.append(stripped_line)
                 continue
 
-            stripped_note = note.strip()
-            if stripped_note != '':
-                yield stripped_note
-                note = ''
+            if note_lines:
+                yield '\n'.join(note_lines)
+                note_lines = []
+
+        if note_lines:
+            yield '\n'.join(note_lines)
+    finally:
+        # the passed file is closed by the caller
+        notes_text_file.detach()
+
+def generate_namespace(
+    image_parameters: types.ImageParameters,
+    fill_parameters: types.FillParameters,
+    text_parameters: types.TextParameters,
+    watermark_parameters: types.WatermarkParameters,
+    encoding_parameters: types.EncodingParameters,
+) -> uuid.UUID:
+    # only the fields affecting the images are listed explicitly, so adding
+    # a parameter doesn't change the note IDs until it's added here
+    font_parameters = text_parameters.font
+    rectangle = text_parameters.rectangle
+    fingerprint = {
+        'version': _FINGERPRINT_VERSION,
+        'image': {
+            'width': image_parameters.width,
+            'height': image_parameters.height,
+            'background_color': str(image_parameters.background_color),
+            'background_image': _get_path(image_parameters.background_image),
+            'background_directory':
+                _get_path(image_parameters.background_directory),
+            'background_choice': image_parameters.background_choice.value,
+            'resizing_filter': image_parameters.resizing_filter.name,
+            'no_resizing': image_parameters.no_resizing,
+        },
+        'fill': {
+            'type': fill_parameters.type.value,
+            'second_color': str(fill_parameters.second_color),
+            'pattern_size': fill_parameters.pattern_size,
+        },
+        'text': {
+            'font': {
+                'file': _get_path(font_parameters.file),
+                'size': font_parameters.size,
+                'size_auto': font_parameters.size_auto,
+                'color': str(font_parameters.color),
+            },
+            'rectangle': {
+                'left': rectangle.left,
+                'top': rectangle.top,
+                'right': rectangle.right,
+                'bottom': rectangle.bottom,
+            },
+            'horizontal_align': text_parameters.horizontal_align.value,
+            'vertical_align': text_parameters.vertical_align.value,
+        },
+        'watermark': {
+            'text': watermark_parameters.text,
+            'image': _get_path(watermark_parameters.image),
+            'size': watermark_parameters.size,
+            'color': str(watermark_parameters.color),
+        },
+        'encoding': {
+            'format': encoding_parameters.format.value,
+            'compress_level': encoding_parameters.compress_level,
+            'quality': encoding_parameters.quality,
+            'optimize': encoding_parameters.optimize,
+            'quantize': encoding_parameters.quantize,
+        },
+    }
+    return uuid.uuid5(_UUID_NAMESPACE, json.dumps(fingerprint, sort_keys=True))
+
+def generate_note_id(note: str, namespace: uuid.UUID = _UUID_NAMESPACE) -> str:
+    return str(uuid.uuid5(namespace, note))
+
+def _get_path(path: pathlib.Path | None) -> str | None:
+    return str(path) if path is not None else None
+
+def _open_notes_file(
+    notes_filename: pathlib.Path,
+) -> typing.ContextManager[typing.BinaryIO]:
+    if notes_filename == STDIN_FILENAME:
+        # the standard input shouldn't be closed after reading
+        return contextlib.nullcontext(sys.stdin.buffer)
+
+    if notes_filename.suffix == '.gz':
+        return typing.cast(typing.BinaryIO, gzip.open(notes_filename))
+
+    if notes_filename.suffix == '.zst':
+        try:
+            import zstandard
+        except ImportError as exception:
+            raise Exception(
+                'the zstandard package is required to read .zst files',
+            ) from exception
 
-        stripped_note = note.strip()
-        if stripped_note != '':
-            yield stripped_note
+        return typing.cast(typing.BinaryIO, io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(open(notes_filename, 'rb')),
+            buffer_size=_READING_BUFFER_SIZE,
+        ))
 
-def generate_note_id(note: str) -> str:
-    return str(uuid.uuid5(_UUID_NAMESPACE, note))
+    return open(notes_filename, 'rb', buffering=_READING_BUFFER_SIZE)
@@ -1,11 +1,17 @@
+import io as std_io
 import unittest
+import unittest.mock
 import tempfile
 import pathlib
+import gzip
+import uuid
+import importlib.util
 
 import termcolor
 
 from . import logger
 from . import io
+from . import types
 
 class TestReadNotes(unittest.TestCase):
   _tmpDir: tempfile.TemporaryDirectory[str]
@@ -30,6 +36,12 @@ class TestReadNotes(unittest.TestCase):
     notes = list(io.read_notes(self._get_notes_filename()))
     self.assertEqual(notes, ['note #1'])
 
+  def test_offset(self) -> None:
+    self._write_notes_content('note #1\n\nnote #2\n\nnote #3')
+
+    notes = list(io.read_notes(self._get_notes_filename(), len('note #1')))
+    self.assertEqual(notes, ['note #2', 'note #3'])
+
   def test_single_note_with_multiple_lines(self) -> None:
     self._write_notes_content('note #1; line #1\nnote #1; line #2')
 
@@ -122,9 +134,155 @@ class TestReadNotes(unittest.TestCase):
       'note #2; line #1\nnote #2; line #2',
     ])
 
+  def test_windows_line_breaks(self) -> None:
+    self._write_notes_content(
+      'note #1; line #1\r\nnote #1; line #2\r\n'
+        + '\r\n'
+        + 'note #2; line #1\r\nnote #2; line #2\r\n',
+    )
+
+    notes = list(io.read_notes(self._get_notes_filename()))
+    self.assertEqual(notes, [
+      'note #1; line #1\nnote #1; line #2',
+      'note #2; line #1\nnote #2; line #2',
+    ])
+
+  def test_unicode_spaces_in_separator_line(self) -> None:
+    self._write_notes_content(
+      'note #1; line #1\nnote #1; line #2\n'
+        + '\u3000\n'
+        + 'note #2; line #1\nnote #2; line #2',
+    )
+
+    notes = list(io.read_notes(self._get_notes_filename()))
+    self.assertEqual(notes, [
+      'note #1; line #1\nnote #1; line #2',
+      'note #2; line #1\nnote #2; line #2',
+    ])
+
+  def test_gzip_file(self) -> None:
+    notes_filename = pathlib.Path(self._tmpDir.name) / 'notes.txt.gz'
+    with gzip.open(notes_filename, mode='wt') as notes_file:
+      notes_file.write('note #1\n\nnote #2')
+
+    notes = list(io.read_notes(notes_filename))
+    self.assertEqual(notes, ['note #1', 'note #2'])
+
+  @unittest.skipUnless(
+    importlib.util.find_spec('zstandard') is not None,
+    'the zstandard package is not installed',
+  )
+  def test_zstandard_file(self) -> None:
+    import zstandard
+
+    notes_filename = pathlib.Path(self._tmpDir.name) / 'notes.txt.zst'
+    notes_filename.write_bytes(
+      zstandard.ZstdCompressor().compress(b'note #1\n\nnote #2'),
+    )
+
+    notes = list(io.read_notes(notes_filename))
+    self.assertEqual(notes, ['note #1', 'note #2'])
+
+  def test_standard_input(self) -> None:
+    stdin = unittest.mock.Mock(buffer=std_io.BytesIO(b'note #1\n\nnote #2'))
+    with unittest.mock.patch('sys.stdin', stdin):
+      notes = list(io.read_notes(io.STDIN_FILENAME))
+
+    self.assertEqual(notes, ['note #1', 'note #2'])
+    self.assertFalse(stdin.buffer.closed)
+
   def _get_notes_filename(self) -> pathlib.Path:
     return pathlib.Path(self._tmpDir.name) / 'notes.txt'
 
   def _write_notes_content(self, notes_content: str) -> None:
     with open(self._get_notes_filename(), mode='w') as notes_file:
       notes_file.write(notes_content)
+
+class TestGenerateNoteId(unittest.TestCase):
+  def test_stable_id(self) -> None:
+    note_id = io.generate_note_id('note #1')
+    self.assertEqual(note_id, '41c65914-33d7-5c7b-92e5-8750d13ac2cc')
+
+  def test_stable_id_with_namespace(self) -> None:
+    namespace = _generate_namespace()
+    note_id = io.generate_note_id('note #1', namespace)
+    self.assertEqual(note_id, '06994d8b-7ff3-5e07-9949-47ad252d2d64')
+
+  def test_different_notes(self) -> None:
+    self.assertNotEqual(
+      io.generate_note_id('note #1'),
+      io.generate_note_id('note #2'),
+    )
+
+  def test_different_parameters(self) -> None:
+    namespace = _generate_namespace(types.ImageParameters(width=640))
+    other_namespace = _generate_namespace(types.ImageParameters(width=320))
+    self.assertNotEqual(
+      io.generate_note_id('note #1', namespace),
+      io.generate_note_id('note #1', other_namespace),
+    )
+
+  def test_different_font_size_auto(self) -> None:
+    other_text_parameters = types.TextParameters(
+      font=types.FontParameters(size_auto=(10, 50)),
+    )
+    self.assertNotEqual(
+      _generate_namespace(),
+      _generate_namespace(text_parameters=other_text_parameters),
+    )
+
+  def test_different_fill_parameters(self) -> None:
+    other_fill_parameters = types.FillParameters(type=types.FillType.RADIAL)
+    self.assertNotEqual(
+      _generate_namespace(),
+      _generate_namespace(fill_parameters=other_fill_parameters),
+    )
+
+  def test_different_watermark_image(self) -> None:
+    other_watermark_parameters = types.WatermarkParameters(
+      image=pathlib.Path('watermark.png'),
+    )
+    self.assertNotEqual(
+      _generate_namespace(),
+      _generate_namespace(watermark_parameters=other_watermark_parameters),
+    )
+
+  def test_different_encoding_parameters(self) -> None:
+    other_encoding_parameters = types.EncodingParameters(
+      format=types.ImageFormat.JPEG,
+    )
+    self.assertNotEqual(
+      _generate_namespace(),
+      _generate_namespace(encoding_parameters=other_encoding_parameters),
+    )
+
+  def test_different_background_directory(self) -> None:
+    other_image_parameters = types.ImageParameters(
+      background_directory=pathlib.Path('backgrounds'),
+    )
+    self.assertNotEqual(
+      _generate_namespace(),
+      _generate_namespace(other_image_parameters),
+    )
+
+  def test_ignored_parameters(self) -> None:
+    other_image_parameters = types.ImageParameters(background_cache_size=1)
+    self.assertEqual(
+      _generate_namespace(),
+      _generate_namespace(other_image_parameters),
+    )
+
+def _generate_namespace(
+  image_parameters: types.ImageParameters | None = None,
+  fill_parameters: types.FillParameters | None = None,
+  text_parameters: types.TextParameters | None = None,
+  watermark_parameters: types.WatermarkParameters | None = None,
+  encoding_parameters: types.EncodingParameters | None = None,
+) -> uuid.UUID:
+  return io.generate_namespace(
+    image_parameters or types.ImageParameters(),
+    fill_parameters or types.FillParameters(),
+    text_parameters or types.TextParameters(),
+    watermark_parameters or types.WatermarkParameters(),
+    encoding_parameters or types.EncodingParameters(),
+  )
@@ -1,12 +1,143 @@
 import sys
+import time
+import json
+import cProfile
+import pathlib
+import itertools
+import functools
+import dataclasses
+import collections
+import sqlite3
+import typing
+import concurrent.futures
+import importlib.metadata
 
 import termcolor
+from PIL import Image
 
+from . import __version__
 from . import logger
 from . import cli
 from . import io
 from . import db
+from . import bloom
 from . import generation
+from . import text
+from . import writing
+from . import profiling
+from . import atlas
+from . import incremental
+from . import cache
+
+_DATABASE_CHUNK_SIZE = 256
+
+_WorkerResult = typing.TypeVar('_WorkerResult')
+
+@dataclasses.dataclass
+class _EncodingStatistics:
+    image_count: int = 0
+    total_size: int = 0
+    total_time: float = 0.0
+
+    def add(self, encoded_image: generation.EncodedImage) -> None:
+        self.image_count += 1
+        self.total_size += len(encoded_image.data)
+        self.total_time += encoded_image.encoding_time
+
+    def log(self) -> None:
+        if self.image_count == 0:
+            return
+
+        logger.get_logger().info(
+            'encoded %d images: %.1f KiB and %.1f ms per image on average',
+            self.image_count,
+            self.total_size / self.image_count / 1024,
+            self.total_time / self.image_count * 1000,
+        )
+
+@dataclasses.dataclass
+class _BackgroundCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+
+    def add(self, hits: int, misses: int) -> None:
+        self.hits += hits
+        self.misses += misses
+
+    def log(self) -> None:
+        # the cache is used only for the backgrounds from a directory
+        if self.hits + self.misses == 0:
+            return
+
+        logger.get_logger().info(
+            'the background cache has %d hits and %d misses (%.1f%% hit rate)',
+            self.hits,
+            self.misses,
+            self.hits / (self.hits + self.misses) * 100,
+        )
+
+@dataclasses.dataclass
+class _FailureStatistics:
+    # the notes whose images weren't generated, though the run went on
+    note_count: int = 0
+
+class _NoteRecorder:
+    # the notes are recorded in the database only after their images are
+    # written, so the notes of an interrupted run are generated on the next one
+    def __init__(
+        self,
+        db_connection: sqlite3.Connection,
+        bloom_filter: bloom.BloomFilter | None,
+    ) -> None:
+        self._db_connection = db_connection
+        self._bloom_filter = bloom_filter
+        # the notes passed to the generation, but not recorded yet
+        self._pending_notes: dict[str, str] = {}
+        # the IDs are added by the writer threads and taken by the main one
+        self._written_note_ids: collections.deque[str] = collections.deque()
+
+    def filter_new_notes(
+        self,
+        identified_notes: list[tuple[str, str]],
+    ) -> list[tuple[str, str]]:
+        new_notes = collections.deque(db.find_new_in_db(
+            self._db_connection,
+            (
+                note
+                for note_id, note in identified_notes
+                if note_id not in self._pending_notes
+            ),
+            self._bloom_filter,
+        ))
+
+        unique_identified_notes = []
+        for note_id, note in identified_notes:
+            # the new notes keep the order of the passed ones
+            if note_id not in self._pending_notes \
+                and new_notes and new_notes[0] == note:
+                new_notes.popleft()
+                self._pending_notes[note_id] = note
+                unique_identified_notes.append((note_id, note))
+            else:
+                logger.get_logger().warning(
+                    'note %s is duplicated',
+                    termcolor.colored(note_id, 'blue'),
+                )
+
+        return unique_identified_notes
+
+    def record(self, note_ids: typing.Iterable[str]) -> None:
+        self._written_note_ids.extend(note_ids)
+
+    def commit(self) -> None:
+        # the written notes are inserted in batches to reduce the commits
+        notes = []
+        while self._written_note_ids:
+            note_id = self._written_note_ids.popleft()
+            notes.append(self._pending_notes.pop(note_id))
+
+        if notes:
+            db.insert_many_in_db(self._db_connection, notes, self._bloom_filter)
 
 def main() -> None:
     logger.init_logger()
@@ -18,34 +149,579 @@ def main() -> None:
         if not options.output_path.exists():
             options.output_path.mkdir(parents=True)
 
+        profiling.profiler.enabled = \
+            options.profile or options.profile_file is not None
+        code_profiler = None
+        if options.profile_file is not None \
+            and options.profile_format == profiling.ReportFormat.CPROFILE:
+            code_profiler = cProfile.Profile()
+            code_profiler.enable()
+
+        start_time = time.perf_counter()
+
         db_connection = db.connect_to_db()
-        for note in io.read_notes(options.input_file):
-            note_id = io.generate_note_id(note)
-            logger.get_logger().info(
-                'generate an image for the %s note',
-                termcolor.colored(note_id, 'blue'),
-            )
+        bloom_filter = None
+        if options.bloom_filter and not options.no_database:
+            bloom_filter = _load_bloom_filter(db_connection, options)
+
+        notes_offset = 0
+        input_state = None
+        if options.incremental:
+            (notes_offset, input_state) = _scan_notes_file(options.input_file)
+
+        note_recorder = None
+        if not options.no_database:
+            note_recorder = _NoteRecorder(db_connection, bloom_filter)
+
+        rendering_cache = None
+        if options.rendering_cache:
+            rendering_cache = _create_rendering_cache(options)
 
-            if not options.no_database:
-                if not db.exists_in_db(db_connection, note):
-                    db.insert_in_db(db_connection, note)
+        failure_statistics = _FailureStatistics()
+
+        try:
+            notes = _filter_notes(
+                io.read_notes(options.input_file, notes_offset),
+                note_recorder,
+                rendering_cache,
+                options,
+            )
+            with writing.ImageWriter(
+                options.writer_threads,
+                options.writer_queue_size,
+            ) as image_writer:
+                if options.atlas.note_count > 0:
+                    image_count = _generate_atlases(
+                        notes,
+                        image_writer,
+                        note_recorder,
+                        failure_statistics,
+                        options,
+                    )
+                elif options.jobs > 1:
+                    image_count = _generate_images_in_parallel(
+                        notes,
+                        image_writer,
+                        rendering_cache,
+                        note_recorder,
+                        failure_statistics,
+                        options,
+                    )
                 else:
-                    logger.get_logger().warning(
-                        'note %s is duplicated',
-                        termcolor.colored(note_id, 'blue'),
+                    image_count = _generate_images_in_series(
+                        notes,
+                        image_writer,
+                        rendering_cache,
+                        note_recorder,
+                        options,
                     )
-                    continue
 
-            image = generation.generate_image(
-                note,
-                options.image,
-                options.text,
-                options.watermark,
+            # the images taken from the rendering cache are generated too
+            if rendering_cache is not None:
+                image_count += rendering_cache.hits
+                logger.get_logger().info(
+                    'the rendering cache has %d hits and %d misses',
+                    rendering_cache.hits,
+                    rendering_cache.misses,
+                )
+
+            # the state isn't saved on errors, so the notes are read again
+            failure_count = \
+                failure_statistics.note_count + image_writer.failure_count
+            if input_state is not None and failure_count != 0:
+                logger.get_logger().warning(
+                    'the processed part of the %s file isn\'t saved, '
+                        + 'since %d images failed',
+                    termcolor.colored(str(options.input_file), 'blue'),
+                    failure_count,
+                )
+            elif input_state is not None:
+                incremental.save_input_state(options.input_file, input_state)
+        finally:
+            # the writer is closed here, so all the written notes are recorded
+            if note_recorder is not None:
+                note_recorder.commit()
+            if bloom_filter is not None:
+                db.save_bloom_filter(db_connection, bloom_filter)
+
+        if code_profiler is not None:
+            code_profiler.disable()
+        if profiling.profiler.enabled:
+            _report_profiling(
+                image_count,
+                time.perf_counter() - start_time,
+                code_profiler,
+                options,
             )
-            image.save(options.output_path / (note_id + '.png'), 'PNG')
     except Exception as exception:
         logger.get_logger().error(exception)
         sys.exit(1)
     except KeyboardInterrupt:
         print('') # output a line break after the ^C symbol in a terminal
         sys.exit(1)
+
+def _report_profiling(
+    image_count: int,
+    total_time: float,
+    code_profiler: cProfile.Profile | None,
+    options: cli.Options,
+) -> None:
+    profiling.profiler.log_report()
+    logger.get_logger().info(
+        'generated %d images in %.2f s: %.1f notes per second',
+        image_count,
+        total_time,
+        image_count / total_time,
+    )
+
+    if options.profile_file is None:
+        return
+
+    if code_profiler is not None:
+        code_profiler.dump_stats(options.profile_file)
+        return
+
+    with open(options.profile_file, mode='w') as profile_file:
+        json.dump(
+            {
+                'image_count': image_count,
+                'total_time': total_time,
+                'notes_per_second': image_count / total_time,
+                'stages': profiling.profiler.get_report(),
+            },
+            profile_file,
+            indent=2,
+        )
+
+def _scan_notes_file(
+    notes_filename: pathlib.Path,
+) -> tuple[int, incremental.InputState]:
+    previous_input_state = incremental.load_input_state(notes_filename)
+    (notes_offset, input_state) = \
+        incremental.scan_notes_file(notes_filename, previous_input_state)
+    if notes_offset != 0:
+        logger.get_logger().info(
+            'skip the first %d bytes of the %s file, they were processed before',
+            notes_offset,
+            termcolor.colored(str(notes_filename), 'blue'),
+        )
+    elif previous_input_state is not None and previous_input_state.offset != 0:
+        logger.get_logger().warning(
+            'the processed part of the %s file was changed, '
+                + 'the file is read from the start',
+            termcolor.colored(str(notes_filename), 'blue'),
+        )
+
+    return (notes_offset, input_state)
+
+def _load_bloom_filter(
+    db_connection: sqlite3.Connection,
+    options: cli.Options,
+) -> bloom.BloomFilter:
+    bloom_filter = db.load_bloom_filter(
+        db_connection,
+        options.bloom_filter_memory * 2 ** 20,
+        options.bloom_filter_error_rate,
+    )
+    if bloom_filter.item_count > bloom_filter.capacity:
+        logger.get_logger().warning(
+            'the Bloom filter contains %d notes over its capacity of %d notes, '
+                + 'its error rate is higher than the specified one',
+            bloom_filter.item_count,
+            bloom_filter.capacity,
+        )
+
+    return bloom_filter
+
+def _create_rendering_cache(options: cli.Options) -> cache.RenderingCache:
+    rendering_cache_path = options.rendering_cache_path
+    if rendering_cache_path is None:
+        rendering_cache_path = db.get_app_dir() / 'rendering-cache'
+
+    background_files = []
+    if options.image.background_directory is not None:
+        background_files = \
+            generation.find_background_files(options.image.background_directory)
+
+    return cache.RenderingCache(
+        rendering_cache_path,
+        [__version__, importlib.metadata.version('pillow')],
+        [
+            options.image.background_image,
+            *background_files,
+            options.text.font.file,
+            options.watermark.image,
+        ],
+    )
+
+def _filter_notes(
+    notes: typing.Iterable[str],
+    note_recorder: _NoteRecorder | None,
+    rendering_cache: cache.RenderingCache | None,
+    options: cli.Options,
+) -> typing.Iterator[tuple[str, str]]:
+    namespace = io.generate_namespace(
+        options.image,
+        options.fill,
+        options.text,
+        options.watermark,
+        options.encoding,
+    )
+    notes_chunks = _split_into_chunks(notes, _DATABASE_CHUNK_SIZE)
+    while True:
+        # the chunks are measured as a whole, but reported per note
+        start_time = time.perf_counter()
+        notes_chunk = next(notes_chunks, None)
+        if notes_chunk is None:
+            break
+
+        profiling.profiler.add_batch(
+            'reading',
+            time.perf_counter() - start_time,
+            len(notes_chunk),
+        )
+
+        identified_notes = []
+        for note in notes_chunk:
+            note_id = io.generate_note_id(note, namespace)
+            if options.skip_existing \
+                and _get_image_file(note_id, options).exists():
+                logger.get_logger().info(
+                    'skip the %s note, its image already exists',
+                    termcolor.colored(note_id, 'blue'),
+                )
+                continue
+
+            identified_notes.append((note_id, note))
+
+        if note_recorder is not None:
+            start_time = time.perf_counter()
+            note_recorder.commit()
+            checked_note_count = len(identified_notes)
+            identified_notes = note_recorder.filter_new_notes(identified_notes)
+            profiling.profiler.add_batch(
+                'dedup',
+                time.perf_counter() - start_time,
+                checked_note_count,
+            )
+
+        for note_id, note in identified_notes:
+            if rendering_cache is not None and rendering_cache.restore(
+                rendering_cache.get_cache_file(
+                    note_id,
+                    options.encoding.format.extension,
+                ),
+                _get_image_file(note_id, options),
+            ):
+                logger.get_logger().info(
+                    'take the image for the %s note from the rendering cache',
+                    termcolor.colored(note_id, 'blue'),
+                )
+                if note_recorder is not None:
+                    note_recorder.record([note_id])
+
+                continue
+
+            logger.get_logger().info(
+                'generate an image for the %s note',
+                termcolor.colored(note_id, 'blue'),
+            )
+            yield (note_id, note)
+
+def _generate_images_in_series(
+    notes: typing.Iterable[tuple[str, str]],
+    image_writer: writing.ImageWriter,
+    rendering_cache: cache.RenderingCache | None,
+    note_recorder: _NoteRecorder | None,
+    options: cli.Options,
+) -> int:
+    renderer = generation.Renderer(
+        options.image,
+        options.text,
+        options.watermark,
+        options.fill,
+    )
+    encoding_statistics = _EncodingStatistics()
+    for note_id, note in notes:
+        image = renderer.render(note)
+        encoded_image = \
+            generation.encode_image_with_timing(image, options.encoding)
+        # the image is freed before the next one is rendered
+        image.close()
+        _save_image(
+            note_id,
+            encoded_image,
+            image_writer,
+            rendering_cache,
+            note_recorder,
+            encoding_statistics,
+            options,
+        )
+
+    encoding_statistics.log()
+    logger.get_logger().info(
+        'the text box cache has %d hits and %d misses',
+        text.text_box_cache.hits,
+        text.text_box_cache.misses,
+    )
+    background_cache_statistics = _BackgroundCacheStatistics(
+        renderer.background_cache.hits,
+        renderer.background_cache.misses,
+    )
+    background_cache_statistics.log()
+
+    return encoding_statistics.image_count
+
+def _generate_images_in_parallel(
+    notes: typing.Iterable[tuple[str, str]],
+    image_writer: writing.ImageWriter,
+    rendering_cache: cache.RenderingCache | None,
+    note_recorder: _NoteRecorder | None,
+    failure_statistics: _FailureStatistics,
+    options: cli.Options,
+) -> int:
+    encoding_statistics = _EncodingStatistics()
+    background_cache_statistics = _BackgroundCacheStatistics()
+    for note_id, encoded_image in _run_in_workers(
+        notes,
+        generation.generate_image_in_worker,
+        failure_statistics,
+        options,
+    ):
+        background_cache_statistics.add(
+            encoded_image.background_cache_hits,
+            encoded_image.background_cache_misses,
+        )
+        _save_image(
+            note_id,
+            encoded_image,
+            image_writer,
+            rendering_cache,
+            note_recorder,
+            encoding_statistics,
+            options,
+        )
+
+    encoding_statistics.log()
+    background_cache_statistics.log()
+    return encoding_statistics.image_count
+
+def _generate_atlases(
+    notes: typing.Iterable[tuple[str, str]],
+    image_writer: writing.ImageWriter,
+    note_recorder: _NoteRecorder | None,
+    failure_statistics: _FailureStatistics,
+    options: cli.Options,
+) -> int:
+    encoding_statistics = _EncodingStatistics()
+    background_cache_statistics = _BackgroundCacheStatistics()
+    note_atlas = atlas.Atlas(options.atlas)
+    note_count = 0
+    for note_id, image in _render_images(
+        notes,
+        background_cache_statistics,
+        failure_statistics,
+        options,
+    ):
+        note_atlas.add(note_id, image)
+        note_count += 1
+
+        if note_atlas.is_full:
+            _save_atlas(
+                note_atlas,
+                image_writer,
+                note_recorder,
+                encoding_statistics,
+                options,
+            )
+    if len(note_atlas) != 0:
+        _save_atlas(
+            note_atlas,
+            image_writer,
+            note_recorder,
+            encoding_statistics,
+            options,
+        )
+
+    encoding_statistics.log()
+    background_cache_statistics.log()
+    return note_count
+
+def _render_images(
+    notes: typing.Iterable[tuple[str, str]],
+    background_cache_statistics: _BackgroundCacheStatistics,
+    failure_statistics: _FailureStatistics,
+    options: cli.Options,
+) -> typing.Iterator[tuple[str, Image.Image]]:
+    if options.jobs > 1:
+        for note_id, rendered_image in _run_in_workers(
+            notes,
+            generation.render_image_in_worker,
+            failure_statistics,
+            options,
+            # the atlases have to be the same as in the series mode
+            ordered=True,
+        ):
+            profiling.profiler.add(rendered_image.stage_times)
+            background_cache_statistics.add(
+                rendered_image.background_cache_hits,
+                rendered_image.background_cache_misses,
+            )
+            yield (note_id, rendered_image.image)
+
+        return
+
+    renderer = generation.Renderer(
+        options.image,
+        options.text,
+        options.watermark,
+        options.fill,
+    )
+    for note_id, note in notes:
+        yield (note_id, renderer.render(note))
+
+    background_cache_statistics.add(
+        renderer.background_cache.hits,
+        renderer.background_cache.misses,
+    )
+
+def _run_in_workers(
+    notes: typing.Iterable[tuple[str, str]],
+    worker_function: typing.Callable[[str], _WorkerResult],
+    failure_statistics: _FailureStatistics,
+    options: cli.Options,
+    ordered: bool = False,
+) -> typing.Iterator[tuple[str, _WorkerResult]]:
+    # each pending task holds one image in a process or in its result,
+    # and the atlas holds its tiles besides them
+    max_pending_tasks = options.jobs * generation.TASKS_PER_JOB
+    if options.max_inflight_images is not None:
+        max_pending_tasks = \
+            options.max_inflight_images - options.atlas.note_count
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=options.jobs,
+        initializer=generation.init_worker,
+        initargs=(
+            options.image,
+            options.text,
+            options.watermark,
+            options.encoding,
+            options.fill,
+            profiling.profiler.enabled,
+        ),
+    ) as executor:
+        lost_note_count = 0
+        for note_id, task in generation.run_in_workers(
+            executor,
+            worker_function,
+            notes,
+            max_pending_tasks,
+            ordered,
+        ):
+            try:
+                result = task.result()
+            except concurrent.futures.BrokenExecutor:
+                logger.get_logger().error(
+                    'the image for the %s note is lost with the processes',
+                    termcolor.colored(note_id, 'blue'),
+                )
+                lost_note_count += 1
+                continue
+            except Exception as exception:
+                logger.get_logger().error(
+                    'unable to generate an image for the %s note: %s',
+                    termcolor.colored(note_id, 'blue'),
+                    exception,
+                )
+                failure_statistics.note_count += 1
+                continue
+
+            yield (note_id, result)
+
+    # the lost notes and the unread ones aren't recorded in the database,
+    # so they are generated on the next run
+    if lost_note_count != 0:
+        raise Exception(
+            'a worker process was terminated abruptly, '
+                + f'{lost_note_count} notes were lost',
+        )
+
+def _save_atlas(
+    note_atlas: atlas.Atlas,
+    image_writer: writing.ImageWriter,
+    note_recorder: _NoteRecorder | None,
+    encoding_statistics: _EncodingStatistics,
+    options: cli.Options,
+) -> None:
+    (atlas_image, index) = note_atlas.build()
+    # the atlas name is stable, since it depends only on the note IDs
+    atlas_id = io.generate_note_id('\n'.join(note_atlas.note_ids))
+    atlas_file = _get_image_file(atlas_id, options)
+    logger.get_logger().info(
+        'save the %s atlas with %d notes',
+        termcolor.colored(atlas_id, 'blue'),
+        len(note_atlas),
+    )
+
+    encoded_image = \
+        generation.encode_image_with_timing(atlas_image, options.encoding)
+    atlas_image.close()
+    image_writer.write(
+        atlas_file,
+        encoded_image.data,
+        _get_written_callback(note_recorder, note_atlas.note_ids),
+    )
+    image_writer.write(
+        atlas_file.with_suffix('.json'),
+        atlas.encode_index(atlas_file.name, atlas_image.size, index),
+    )
+    encoding_statistics.add(encoded_image)
+
+    note_atlas.clear()
+
+def _save_image(
+    note_id: str,
+    encoded_image: generation.EncodedImage,
+    image_writer: writing.ImageWriter,
+    rendering_cache: cache.RenderingCache | None,
+    note_recorder: _NoteRecorder | None,
+    encoding_statistics: _EncodingStatistics,
+    options: cli.Options,
+) -> None:
+    image_writer.write(
+        _get_image_file(note_id, options),
+        encoded_image.data,
+        _get_written_callback(note_recorder, [note_id]),
+    )
+    if rendering_cache is not None:
+        image_writer.write(
+            rendering_cache.prepare_cache_file(
+                note_id,
+                options.encoding.format.extension,
+            ),
+            encoded_image.data,
+        )
+    encoding_statistics.add(encoded_image)
+    profiling.profiler.add(encoded_image.stage_times)
+
+def _get_written_callback(
+    note_recorder: _NoteRecorder | None,
+    note_ids: list[str],
+) -> typing.Callable[[], None] | None:
+    if note_recorder is None:
+        return None
+
+    return functools.partial(note_recorder.record, note_ids)
+
+def _split_into_chunks(
+    items: typing.Iterable[str],
+    chunk_size: int,
+) -> typing.Iterator[list[str]]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+def _get_image_file(note_id: str, options: cli.Options) -> pathlib.Path:
+    image_filename = note_id + '.' + options.encoding.format.extension
+    return options.output_path / image_filename
@@ -0,0 +1,190 @@
+import os
+import re
+import sys
+import unittest
+import unittest.mock
+import tempfile
+import pathlib
+
+from PIL import Image
+
+from . import logger
+from . import main
+from . import generation
+
+class TestMain(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.tmp_path = pathlib.Path(self._tmpDir.name)
+    self.notes_filename = self.tmp_path / 'notes.txt'
+    self.notes_filename.write_text(
+      '\n\n'.join(f'note #{index}' for index in range(5)),
+    )
+    self.output_path = self.tmp_path / 'images'
+
+    # the database is stored in the home directory
+    home_patcher = unittest.mock.patch.dict(
+      os.environ,
+      {'HOME': str(self.tmp_path)},
+    )
+    home_patcher.start()
+    self.addCleanup(home_patcher.stop)
+
+  def tearDown(self) -> None:
+    self._tmpDir.cleanup()
+
+  def test_interrupted_run(self) -> None:
+    render = generation.Renderer.render
+    rendered_notes: list[str] = []
+
+    def interrupt_render(renderer: generation.Renderer, note: str) -> object:
+      if len(rendered_notes) == 2:
+        raise KeyboardInterrupt()
+
+      rendered_notes.append(note)
+      return render(renderer, note)
+
+    with unittest.mock.patch.object(
+      generation.Renderer,
+      'render',
+      interrupt_render,
+    ):
+      with self.assertRaises(SystemExit):
+        self._run_main()
+    self.assertEqual(len(list(self.output_path.iterdir())), 2)
+
+    with self.assertLogs('white_generator', level='INFO') as logs:
+      self._run_main()
+
+    self.assertEqual(len(list(self.output_path.iterdir())), 5)
+    self.assertEqual(
+      sum('generate an image' in message for message in logs.output),
+      3,
+    )
+
+  def test_run_with_rendering_cache(self) -> None:
+    self._run_main('--no-database', '--rendering-cache')
+    for image_file in self.output_path.iterdir():
+      image_file.unlink()
+
+    with self.assertLogs('white_generator', level='INFO') as logs:
+      self._run_main('--no-database', '--rendering-cache', '--profile')
+
+    self.assertEqual(len(list(self.output_path.iterdir())), 5)
+    self.assertTrue(
+      any('generated 5 images' in message for message in logs.output),
+    )
+
+  def test_parallel_run(self) -> None:
+    self._run_main('--no-database')
+    images = {
+      image_file.name: image_file.read_bytes()
+      for image_file in self.output_path.iterdir()
+    }
+    for image_file in self.output_path.iterdir():
+      image_file.unlink()
+
+    self._run_main('--no-database', '--jobs', '2')
+
+    self.assertEqual(
+      {
+        image_file.name: image_file.read_bytes()
+        for image_file in self.output_path.iterdir()
+      },
+      images,
+    )
+
+  def test_parallel_run_with_terminated_process(self) -> None:
+    render = generation.Renderer.render
+
+    def terminate_render(renderer: generation.Renderer, note: str) -> object:
+      if note == 'note #2':
+        os._exit(1)
+
+      return render(renderer, note)
+
+    # the worker processes are forked with the patched method
+    with unittest.mock.patch.object(
+      generation.Renderer,
+      'render',
+      terminate_render,
+    ):
+      with self.assertLogs('white_generator', level='ERROR') as logs:
+        with self.assertRaises(SystemExit):
+          self._run_main('--jobs', '2')
+    self.assertTrue(any('notes were lost' in message for message in logs.output))
+    self.assertLess(len(list(self.output_path.iterdir())), 5)
+
+    self._run_main('--jobs', '2')
+
+    self.assertEqual(len(list(self.output_path.iterdir())), 5)
+
+  def test_incremental_parallel_run_with_failed_note(self) -> None:
+    render = generation.Renderer.render
+
+    def fail_render(renderer: generation.Renderer, note: str) -> object:
+      if note == 'note #2':
+        raise ValueError('broken note')
+
+      return render(renderer, note)
+
+    with unittest.mock.patch.object(generation.Renderer, 'render', fail_render):
+      with self.assertLogs('white_generator', level='WARNING') as logs:
+        self._run_main('--incremental', '--jobs', '2')
+    self.assertTrue(any('isn\'t saved' in message for message in logs.output))
+    self.assertEqual(len(list(self.output_path.iterdir())), 4)
+
+    self._run_main('--incremental', '--jobs', '2')
+
+    self.assertEqual(len(list(self.output_path.iterdir())), 5)
+
+  def test_parallel_runs_with_background_directory(self) -> None:
+    background_path = self.tmp_path / 'backgrounds'
+    background_path.mkdir()
+    for color in ['red', 'blue']:
+      Image.new('RGB', (320, 240), color).save(background_path / f'{color}.png')
+
+    for arguments in [
+      ('--jobs', '2'),
+      ('--jobs', '2', '--atlas-note-count', '2'),
+    ]:
+      with self.subTest(arguments=arguments):
+        with self.assertLogs('white_generator', level='INFO') as logs:
+          self._run_main(
+            '--no-database',
+            '--image-background-directory',
+            str(background_path),
+            *arguments,
+          )
+
+        background_cache_logs = [
+          message
+          for message in logs.output
+          if 'the background cache has' in message
+        ]
+        self.assertEqual(len(background_cache_logs), 1)
+        # each note is counted once, as a hit or a miss of its process cache
+        counts = re.search(
+          r'(\d+) hits and (\d+) misses',
+          background_cache_logs[0],
+        )
+        assert counts is not None
+        self.assertEqual(int(counts[1]) + int(counts[2]), 5)
+
+  def _run_main(self, *arguments: str) -> None:
+    argv = [
+      'white-generator',
+      '--input-file',
+      str(self.notes_filename),
+      '--output-path',
+      str(self.output_path),
+      '--image-width',
+      '320',
+      '--image-height',
+      '240',
+      *arguments,
+    ]
+    # the logger isn't initialized again to avoid the repeated handlers
+    with unittest.mock.patch.object(logger, 'init_logger'), \
+      unittest.mock.patch.object(sys, 'argv', argv):
+      main.main()
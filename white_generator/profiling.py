@@ -0,0 +1,92 @@
+import collections
+import contextlib
+import enum
+import math
+import time
+import typing
+
+from . import logger
+
+_PERCENTILES = (50, 95, 99)
+
+_StageTimes: typing.TypeAlias = dict[str, list[float]]
+
+# TODO: replace with `enum.StrEnum` after upgrading to Python 3.11
+class ReportFormat(str, enum.Enum):
+    JSON = 'json'
+    CPROFILE = 'cprofile'
+
+class Profiler:
+    def __init__(self) -> None:
+        self.enabled = False
+
+        self._stage_times: collections.defaultdict[str, list[float]] = \
+            collections.defaultdict(list)
+        self._disabled_timer = contextlib.nullcontext()
+
+    def measure(self, stage: str) -> typing.ContextManager[object]:
+        # the disabled profiler costs only this check
+        if not self.enabled:
+            return self._disabled_timer
+
+        return self._measure(stage)
+
+    def add(self, stage_times: _StageTimes) -> None:
+        for stage, durations in stage_times.items():
+            self._stage_times[stage].extend(durations)
+
+    def add_batch(self, stage: str, duration: float, item_count: int) -> None:
+        # the duration of a batch is divided between its items, so the batch
+        # stages are reported per item like the other ones
+        if not self.enabled or item_count == 0:
+            return
+
+        self._stage_times[stage].extend([duration / item_count] * item_count)
+
+    def pop_stage_times(self) -> _StageTimes:
+        stage_times = dict(self._stage_times)
+        self._stage_times.clear()
+
+        return stage_times
+
+    def get_report(self) -> dict[str, dict[str, float]]:
+        report = {}
+        for stage, durations in self._stage_times.items():
+            sorted_durations = sorted(durations)
+            report[stage] = {
+                'count': len(sorted_durations),
+                'total': sum(sorted_durations),
+            }
+            for percentile in _PERCENTILES:
+                report[stage][f'p{percentile}'] = \
+                    _get_percentile(sorted_durations, percentile)
+
+        return report
+
+    def log_report(self) -> None:
+        for stage, statistics in self.get_report().items():
+            logger.get_logger().info(
+                'the %s stage: p50 %.2f ms, p95 %.2f ms, p99 %.2f ms '
+                    + '(%d runs, %.2f s in total)',
+                stage,
+                statistics['p50'] * 1000,
+                statistics['p95'] * 1000,
+                statistics['p99'] * 1000,
+                statistics['count'],
+                statistics['total'],
+            )
+
+    @contextlib.contextmanager
+    def _measure(self, stage: str) -> typing.Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stage_times[stage].append(time.perf_counter() - start_time)
+
+profiler = Profiler()
+
+def _get_percentile(sorted_values: list[float], percentile: int) -> float:
+    # the nearest-rank method, so the result is one of the measured values
+    rank = math.ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
@@ -0,0 +1,79 @@
+import unittest
+
+from . import profiling
+
+class TestProfiler(unittest.TestCase):
+  def test_measure_disabled(self) -> None:
+    profiler = profiling.Profiler()
+    with profiler.measure('stage'):
+      pass
+
+    self.assertEqual(profiler.get_report(), {})
+
+  def test_measure_enabled(self) -> None:
+    profiler = profiling.Profiler()
+    profiler.enabled = True
+    for _ in range(3):
+      with profiler.measure('stage'):
+        pass
+
+    report = profiler.get_report()
+    self.assertEqual(list(report), ['stage'])
+    self.assertEqual(report['stage']['count'], 3)
+    self.assertGreaterEqual(report['stage']['p50'], 0.0)
+
+  def test_measure_with_exception(self) -> None:
+    profiler = profiling.Profiler()
+    profiler.enabled = True
+    with self.assertRaises(RuntimeError):
+      with profiler.measure('stage'):
+        raise RuntimeError('test')
+
+    self.assertEqual(profiler.get_report()['stage']['count'], 1)
+
+  def test_add_batch(self) -> None:
+    profiler = profiling.Profiler()
+    profiler.enabled = True
+    profiler.add_batch('stage', 3.0, 4)
+    profiler.add_batch('stage', 1.0, 0)
+
+    self.assertEqual(profiler.pop_stage_times(), {'stage': [0.75] * 4})
+
+  def test_add_batch_disabled(self) -> None:
+    profiler = profiling.Profiler()
+    profiler.add_batch('stage', 3.0, 4)
+
+    self.assertEqual(profiler.get_report(), {})
+
+  def test_get_report(self) -> None:
+    profiler = profiling.Profiler()
+    profiler.add({'stage': [float(value) for value in range(100, 0, -1)]})
+
+    self.assertEqual(profiler.get_report(), {
+      'stage': {
+        'count': 100,
+        'total': 5050.0,
+        'p50': 50.0,
+        'p95': 95.0,
+        'p99': 99.0,
+      },
+    })
+
+  def test_get_report_with_one_value(self) -> None:
+    profiler = profiling.Profiler()
+    profiler.add({'stage': [1.5]})
+
+    report = profiler.get_report()
+    self.assertEqual(report['stage']['p50'], 1.5)
+    self.assertEqual(report['stage']['p99'], 1.5)
+
+  def test_pop_stage_times(self) -> None:
+    profiler = profiling.Profiler()
+    profiler.add({'one': [1.0], 'two': [2.0, 3.0]})
+    profiler.add({'one': [4.0]})
+
+    self.assertEqual(
+      profiler.pop_stage_times(),
+      {'one': [1.0, 4.0], 'two': [2.0, 3.0]},
+    )
+    self.assertEqual(profiler.pop_stage_times(), {})
@@ -0,0 +1,456 @@
+from __future__ import annotations
+import sys
+import json
+import signal
+import uuid
+import pathlib
+import argparse
+import threading
+import functools
+import dataclasses
+import http.server
+import socketserver
+import concurrent.futures
+import typing
+from types import TracebackType
+
+import termcolor
+
+from . import logger
+from . import cli
+from . import io
+from . import types
+from . import cache
+from . import generation
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_TIMEOUT = 30.0
+
+_MAX_REQUEST_SIZE = 1 << 20
+_RENDERER_CACHE_SIZE = 16
+_MAX_IMAGE_SIZE = 4096
+_MAX_FONT_SIZE = 1024
+_MAX_BACKGROUND_CACHE_SIZE = 64
+
+# only these generation options can be changed by a request; the paths
+# aren't among them, so a request can't make the server read its files
+_REQUEST_OPTIONS = {
+    'image_width': '--image-width',
+    'image_height': '--image-height',
+    'image_background_color': '--image-background-color',
+    'image_background_choice': '--image-background-choice',
+    'image_background_cache_size': '--image-background-cache-size',
+    'image_resizing_filter': '--image-resizing-filter',
+    'image_no_resizing': '--no-resizing',
+    'fill_type': '--fill-type',
+    'fill_second_color': '--fill-second-color',
+    'fill_pattern_size': '--fill-pattern-size',
+    'text_rectangle_left': '--text-rectangle-left',
+    'text_rectangle_top': '--text-rectangle-top',
+    'text_rectangle_right': '--text-rectangle-right',
+    'text_rectangle_bottom': '--text-rectangle-bottom',
+    'text_horizontal_align': '--text-horizontal-align',
+    'text_vertical_align': '--text-vertical-align',
+    'text_font_size': '--text-font-size',
+    'text_font_size_auto': '--text-font-size-auto',
+    'text_font_color': '--text-font-color',
+    'watermark_text': '--watermark-text',
+    'watermark_size': '--watermark-size',
+    'watermark_color': '--watermark-color',
+    'encoding_format': '--output-format',
+    'encoding_compress_level': '--compress-level',
+    'encoding_quality': '--quality',
+    'encoding_optimize': '--optimize',
+    'encoding_quantize': '--quantize',
+}
+# the sizes are bounded, so a request can't exhaust the memory of a worker
+_REQUEST_SIZE_LIMITS = {
+    'image_width': _MAX_IMAGE_SIZE,
+    'image_height': _MAX_IMAGE_SIZE,
+    'image_background_cache_size': _MAX_BACKGROUND_CACHE_SIZE,
+    'fill_pattern_size': _MAX_IMAGE_SIZE,
+    'text_font_size': _MAX_FONT_SIZE,
+    'text_font_size_auto': _MAX_FONT_SIZE,
+    'watermark_size': _MAX_FONT_SIZE,
+}
+
+_RendererKey: typing.TypeAlias = tuple[uuid.UUID, int]
+
+class BusyError(Exception):
+    pass
+
+@dataclasses.dataclass
+class RenderedNote:
+    note_id: str
+    image_format: types.ImageFormat
+    data: bytes
+
+class RenderingService:
+    def __init__(
+        self,
+        default_arguments: list[str],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.timeout = timeout
+
+        self._parser = cli.create_parser(_ParameterParser)
+        self._default_arguments = default_arguments
+        default_options = self._parse_options({})
+        # the renderers are created on the pool start, so the first requests
+        # don't wait for a loading of the fonts and the images
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=default_options.jobs,
+            initializer=_init_worker,
+            initargs=(_get_rendering_parameters(default_options),),
+        )
+        # a slot is released only when its rendering is finished,
+        # so the timed out requests still hold their slots
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def __enter__(self) -> RenderingService:
+        return self
+
+    def __exit__(
+        self,
+        exception_type: type[BaseException] | None,
+        exception: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def render(self, note: str, parameters: dict[str, object]) -> RenderedNote:
+        options = self._parse_options(parameters)
+        rendering_parameters = _get_rendering_parameters(options)
+        if not self._slots.acquire(blocking=False):
+            raise BusyError('too many concurrent requests')
+
+        try:
+            task = self._executor.submit(_render_note, note, rendering_parameters)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        task.add_done_callback(lambda _: self._slots.release())
+        try:
+            image_data = task.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            # only a queued rendering can be cancelled
+            task.cancel()
+            raise
+
+        return RenderedNote(
+            io.generate_note_id(note, rendering_parameters.namespace),
+            options.encoding.format,
+            image_data,
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+    def _parse_options(self, parameters: dict[str, object]) -> cli.Options:
+        options = self._parser.parse_args(
+            [
+                '--input-file',
+                str(io.STDIN_FILENAME),
+                *self._default_arguments,
+                *_get_parameter_arguments(parameters),
+            ],
+            namespace=cli.Options(),
+        )
+        cli.check_options(self._parser, options)
+
+        return options
+
+def main() -> None:
+    logger.init_logger()
+
+    parser = argparse.ArgumentParser(
+        prog=__package__.replace('_', '-') + '-serve',
+        formatter_class=cli.HelpFormatter,
+        epilog='the other options are the generation options ' \
+            + f'(see {__package__.replace("_", "-")} --help); ' \
+            + 'they set the default parameters of the requests',
+    )
+    parser.add_argument(
+        '--host',
+        default=DEFAULT_HOST,
+        help='the host to listen to',
+    )
+    parser.add_argument(
+        '--port',
+        type=cli.parse_positive_integer,
+        default=DEFAULT_PORT,
+        help='the port to listen to',
+    )
+    parser.add_argument(
+        '--unix-socket',
+        type=pathlib.Path,
+        help='the path to the Unix socket to listen to ' \
+            + '(if none, the host and the port are used)',
+    )
+    parser.add_argument(
+        '--max-concurrency',
+        type=cli.parse_positive_integer,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help='the number of requests rendered or queued at once ' \
+            + '(the other requests are rejected)',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=cli.parse_positive_number,
+        default=DEFAULT_TIMEOUT,
+        help='the timeout of a request in seconds',
+    )
+    (arguments, generation_arguments) = parser.parse_known_args()
+
+    try:
+        with RenderingService(
+            generation_arguments,
+            arguments.max_concurrency,
+            arguments.timeout,
+        ) as service:
+            server = _create_server(arguments, service)
+            # the service managers stop a server by the SIGTERM signal
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+            try:
+                logger.get_logger().info(
+                    'serve the requests on %s',
+                    termcolor.colored(_get_address(arguments), 'blue'),
+                )
+                server.serve_forever()
+            finally:
+                server.server_close()
+                if arguments.unix_socket is not None:
+                    arguments.unix_socket.unlink(missing_ok=True)
+    except Exception as exception:
+        logger.get_logger().error(exception)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print('') # output a line break after the ^C symbol in a terminal
+
+@dataclasses.dataclass
+class _RenderingParameters:
+    image: types.ImageParameters
+    fill: types.FillParameters
+    text: types.TextParameters
+    watermark: types.WatermarkParameters
+    encoding: types.EncodingParameters
+    # it identifies the parameters like in the note IDs
+    namespace: uuid.UUID
+
+class _ParameterParser(argparse.ArgumentParser):
+    def error(self, message: str) -> typing.NoReturn:
+        # the invalid parameters of a request shouldn't stop the server
+        raise ValueError(message)
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    # the connections are kept alive to skip their setting up
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(
+        self,
+        *arguments: typing.Any,
+        service: RenderingService,
+        **keyword_arguments: typing.Any,
+    ) -> None:
+        self.service = service
+        super().__init__(*arguments, **keyword_arguments)
+
+    def setup(self) -> None:
+        super().setup()
+        # the reading of a request is limited by the same timeout
+        self.connection.settimeout(self.service.timeout)
+
+    def do_GET(self) -> None:
+        if self.path != '/health':
+            self.send_error(http.HTTPStatus.NOT_FOUND)
+            return
+
+        self._send_data('text/plain', b'ok\n')
+
+    def do_POST(self) -> None:
+        if self.path != '/render':
+            self.send_error(http.HTTPStatus.NOT_FOUND)
+            return
+
+        try:
+            (note, parameters) = self._read_request()
+            rendered_note = self.service.render(note, parameters)
+        except _RequestSizeError as exception:
+            self.send_error(http.HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(exception))
+            return
+        except ValueError as exception:
+            self.send_error(http.HTTPStatus.BAD_REQUEST, str(exception))
+            return
+        except BusyError as exception:
+            self.send_error(http.HTTPStatus.SERVICE_UNAVAILABLE, str(exception))
+            return
+        except concurrent.futures.TimeoutError:
+            self.send_error(http.HTTPStatus.GATEWAY_TIMEOUT)
+            return
+        except Exception as exception:
+            logger.get_logger().error('unable to render the note: %s', exception)
+            self.send_error(http.HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+
+        self._send_data(
+            'image/' + rendered_note.image_format.value,
+            rendered_note.data,
+            [('X-Note-Id', rendered_note.note_id)],
+        )
+
+    def log_message(self, message_format: str, *arguments: typing.Any) -> None:
+        # the default logging fails on the Unix socket addresses
+        logger.get_logger().info(message_format, *arguments)
+
+    def _read_request(self) -> tuple[str, dict[str, object]]:
+        try:
+            request_size = int(self.headers.get('Content-Length', ''))
+        except ValueError as exception:
+            raise ValueError('the request size is required') from exception
+        if request_size > _MAX_REQUEST_SIZE:
+            raise _RequestSizeError(
+                f'the request size exceeds {_MAX_REQUEST_SIZE} bytes',
+            )
+
+        request = json.loads(self.rfile.read(request_size))
+        if not isinstance(request, dict) \
+            or not isinstance(request.get('note'), str):
+            raise ValueError('the request must be an object with a note')
+
+        parameters = request.get('parameters', {})
+        if not isinstance(parameters, dict):
+            raise ValueError('the request parameters must be an object')
+
+        return (request['note'], parameters)
+
+    def _send_data(
+        self,
+        content_type: str,
+        data: bytes,
+        headers: typing.Iterable[tuple[str, str]] = (),
+    ) -> None:
+        self.send_response(http.HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+        self.wfile.write(data)
+
+class _RequestSizeError(ValueError):
+    pass
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+# the renderers of the recent parameters are kept by each worker
+_worker_renderers: cache.LRUCache[_RendererKey, generation.Renderer] = \
+    cache.LRUCache(_RENDERER_CACHE_SIZE)
+
+def _init_worker(rendering_parameters: _RenderingParameters) -> None:
+    _get_worker_renderer(rendering_parameters)
+
+def _render_note(note: str, rendering_parameters: _RenderingParameters) -> bytes:
+    image = _get_worker_renderer(rendering_parameters).render(note)
+    image_data = generation.encode_image(image, rendering_parameters.encoding)
+    image.close()
+
+    return image_data
+
+def _get_worker_renderer(
+    rendering_parameters: _RenderingParameters,
+) -> generation.Renderer:
+    # the namespace misses the settings that don't change the images,
+    # but they still change the renderer
+    return _worker_renderers.get(
+        (
+            rendering_parameters.namespace,
+            rendering_parameters.image.background_cache_size,
+        ),
+        lambda: generation.Renderer(
+            rendering_parameters.image,
+            rendering_parameters.text,
+            rendering_parameters.watermark,
+            rendering_parameters.fill,
+        ),
+    )
+
+def _get_rendering_parameters(options: cli.Options) -> _RenderingParameters:
+    return _RenderingParameters(
+        options.image,
+        options.fill,
+        options.text,
+        options.watermark,
+        options.encoding,
+        io.generate_namespace(
+            options.image,
+            options.fill,
+            options.text,
+            options.watermark,
+            options.encoding,
+        ),
+    )
+
+def _get_parameter_arguments(parameters: dict[str, object]) -> list[str]:
+    arguments = []
+    for name, value in parameters.items():
+        name = name.replace('-', '_')
+        option = _REQUEST_OPTIONS.get(name)
+        if option is None:
+            raise ValueError(f'unsupported parameter: {name}')
+
+        if value is True:
+            arguments.append(option)
+        elif value is not False and value is not None:
+            _check_parameter_size(name, str(value))
+            # the value is joined with the option, so a value
+            # starting with a dash isn't taken for another option
+            arguments.append(f'{option}={value}')
+
+    return arguments
+
+def _check_parameter_size(name: str, value: str) -> None:
+    size_limit = _REQUEST_SIZE_LIMITS.get(name)
+    if size_limit is None:
+        return
+
+    try:
+        sizes = cli.parse_size_range(value) \
+            if name == 'text_font_size_auto' \
+            else (cli.parse_positive_integer(value),)
+    except argparse.ArgumentTypeError as exception:
+        raise ValueError(f'invalid {name} parameter: {exception}') from exception
+
+    if max(sizes) > size_limit:
+        raise ValueError(f'the {name} parameter exceeds {size_limit}: {value}')
+
+def _create_server(
+    arguments: argparse.Namespace,
+    service: RenderingService,
+) -> socketserver.BaseServer:
+    request_handler = functools.partial(_RequestHandler, service=service)
+    if arguments.unix_socket is None:
+        return http.server.ThreadingHTTPServer(
+            (arguments.host, arguments.port),
+            request_handler,
+        )
+
+    # the socket file remains after a killed server
+    if arguments.unix_socket.is_socket():
+        arguments.unix_socket.unlink()
+
+    return _UnixHTTPServer(str(arguments.unix_socket), request_handler)
+
+def _get_address(arguments: argparse.Namespace) -> str:
+    if arguments.unix_socket is not None:
+        return str(arguments.unix_socket)
+
+    return f'http://{arguments.host}:{arguments.port}'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import unittest
+
+from . import server
+from . import types
+
+class TestRenderingService(unittest.TestCase):
+  service: server.RenderingService
+
+  @classmethod
+  def setUpClass(cls) -> None:
+    cls.service = server.RenderingService(['--image-width', '320'])
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    cls.service.close()
+
+  def test_render(self) -> None:
+    rendered_note = self.service.render('note', {})
+
+    self.assertEqual(rendered_note.image_format, types.ImageFormat.PNG)
+    self.assertTrue(rendered_note.data.startswith(b'\x89PNG'))
+
+  def test_render_with_parameters(self) -> None:
+    rendered_note = self.service.render('note', {
+      'encoding_format': 'jpeg',
+      'image-no-resizing': True,
+      'encoding_optimize': False,
+    })
+
+    self.assertEqual(rendered_note.image_format, types.ImageFormat.JPEG)
+    self.assertTrue(rendered_note.data.startswith(b'\xff\xd8'))
+    self.assertNotEqual(
+      rendered_note.note_id,
+      self.service.render('note', {}).note_id,
+    )
+
+  def test_render_with_leading_dash_parameter(self) -> None:
+    rendered_note = self.service.render('note', {'watermark_text': '-x'})
+
+    self.assertTrue(rendered_note.data.startswith(b'\x89PNG'))
+    self.assertNotEqual(
+      rendered_note.note_id,
+      self.service.render('note', {}).note_id,
+    )
+
+  def test_render_with_same_parameters(self) -> None:
+    rendered_note = self.service.render('note', {'image_width': 320})
+
+    self.assertEqual(
+      rendered_note.note_id,
+      self.service.render('note', {}).note_id,
+    )
+
+  def test_render_with_unsupported_parameter(self) -> None:
+    with self.assertRaisesRegex(ValueError, 'unsupported parameter'):
+      self.service.render('note', {'output_path': 'images'})
+
+  def test_render_with_path_parameter(self) -> None:
+    with self.assertRaisesRegex(ValueError, 'unsupported parameter'):
+      self.service.render('note', {'text_font_file': '/etc/passwd'})
+
+  def test_render_with_invalid_parameter(self) -> None:
+    with self.assertRaisesRegex(ValueError, 'invalid image_width parameter'):
+      self.service.render('note', {'image_width': 'wide'})
+
+  def test_render_with_too_large_parameter(self) -> None:
+    with self.assertRaisesRegex(ValueError, 'parameter exceeds'):
+      self.service.render('note', {'image_width': 100000})
+
+  def test_render_with_too_large_range_parameter(self) -> None:
+    with self.assertRaisesRegex(ValueError, 'parameter exceeds'):
+      self.service.render('note', {'text_font_size_auto': '10:100000'})
+
+  def test_render_with_conflicting_parameters(self) -> None:
+    with self.assertRaisesRegex(ValueError, 'quantization'):
+      self.service.render('note', {
+        'encoding_format': 'jpeg',
+        'encoding_quantize': True,
+      })
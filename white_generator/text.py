@@ -1,7 +1,20 @@
+import os
+import dataclasses
+import typing
+
 from PIL import ImageDraw
 from PIL import ImageFont
 
 from . import types
+from . import cache
+
+_TEXT_BOX_CACHE_SIZE = 65536
+
+_TextBox: typing.TypeAlias = tuple[int, int, int, int]
+_TextBoxKey: typing.TypeAlias = tuple[typing.Hashable, ...]
+
+text_box_cache: cache.LRUCache[_TextBoxKey, _TextBox] = \
+    cache.LRUCache(_TEXT_BOX_CACHE_SIZE)
 
 def fit_text_rectangle(
     image_parameters: types.ImageParameters,
@@ -48,20 +61,87 @@ def fit_text(
         )
 
     words = [word.strip() for word in text.split(' ') if word.strip() != '']
-    fitted_text = words[0]
     rectangle_width = \
         text_parameters.rectangle.right - text_parameters.rectangle.left
+    # the bounds of the lines are measured separately and then joined,
+    # because the bounding box of multiline text is the union of its lines
+    fitted_lines: list[str] = []
+    fitted_lines_bounds: tuple[int, int] | None = None
+    unmeasured_line: str | None = None
+    line = words[0]
+    line_bounds: tuple[int, int] | None = None
     for word in words[1:]:
-        extended_fitted_text = fitted_text + ' ' + word
-        (text_box_left, _, text_box_right, _) \
-            = draw.multiline_textbbox((0, 0), extended_fitted_text, font=font)
-        text_width = text_box_right - text_box_left
-        if text_width <= rectangle_width:
-            fitted_text = extended_fitted_text
+        if unmeasured_line is not None:
+            fitted_lines_bounds = _join_bounds(
+                _get_horizontal_bounds(draw, unmeasured_line, font),
+                fitted_lines_bounds,
+            )
+            unmeasured_line = None
+
+        extended_line = line + ' ' + word
+        extended_line_bounds = _get_horizontal_bounds(draw, extended_line, font)
+        (text_left, text_right) = \
+            _join_bounds(extended_line_bounds, fitted_lines_bounds)
+        if text_right - text_left <= rectangle_width:
+            line = extended_line
+            line_bounds = extended_line_bounds
+            continue
+
+        fitted_lines.append(line)
+        if line_bounds is not None:
+            fitted_lines_bounds = _join_bounds(line_bounds, fitted_lines_bounds)
+        else:
+            unmeasured_line = line
+
+        line = word
+        line_bounds = None
+
+    fitted_lines.append(line)
+    return '\n'.join(fitted_lines)
+
+def fit_font_size(
+    draw: ImageDraw.ImageDraw,
+    text: str,
+    image_parameters: types.ImageParameters,
+    text_parameters: types.TextParameters,
+    get_font: typing.Callable[[int], ImageFont.FreeTypeFont | ImageFont.ImageFont],
+) -> tuple[ImageFont.FreeTypeFont | ImageFont.ImageFont, types.TextParameters, str]:
+    assert text_parameters.font.size_auto is not None
+
+    # the largest fitting size is searched by the bisection, so the number
+    # of layouts is logarithmic; the text boxes of the words and lines
+    # measured for a size are reused by the next layouts with this size
+    (minimal_size, maximal_size) = text_parameters.font.size_auto
+    fitted_layout = None
+    (lower_size, upper_size) = (minimal_size, maximal_size)
+    while lower_size <= upper_size:
+        size = (lower_size + upper_size) // 2
+        layout = _lay_out_text(
+            draw,
+            text,
+            image_parameters,
+            text_parameters,
+            size,
+            get_font(size),
+        )
+        if _is_text_fitted(draw, *layout):
+            fitted_layout = layout
+            lower_size = size + 1
         else:
-            fitted_text += '\n' + word
+            upper_size = size - 1
+
+    if fitted_layout is None:
+        # the text overflows the rectangle even with the minimal size
+        fitted_layout = _lay_out_text(
+            draw,
+            text,
+            image_parameters,
+            text_parameters,
+            minimal_size,
+            get_font(minimal_size),
+        )
 
-    return fitted_text
+    return fitted_layout
 
 def get_text_position(
     draw: ImageDraw.ImageDraw,
@@ -70,7 +150,7 @@ def get_text_position(
     font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
 ) -> tuple[int, int]:
     (text_box_left, text_box_top, text_box_right, text_box_bottom) \
-        = draw.multiline_textbbox((0, 0), text, font=font)
+        = _get_text_box(draw, text, font)
     text_width = text_box_right - text_box_left
     text_left = _get_text_position_on_axis(
         text_parameters.rectangle.left,
@@ -94,7 +174,7 @@ def get_watermark_position(
     font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
 ) -> tuple[int, int]:
     (text_box_left, text_box_top, text_box_right, text_box_bottom) \
-        = draw.multiline_textbbox((0, 0), text, font=font)
+        = _get_text_box(draw, text, font)
     text_width = text_box_right - text_box_left
     text_left = image_parameters.width - text_width
     text_height = text_box_bottom - text_box_top
@@ -107,6 +187,75 @@ def _add_modulus_to_negative(value: int, modulus: int) -> int:
 def _crop(value: int, minimum: int, maximum: int) -> int:
     return max(minimum, min(value, maximum))
 
+def _lay_out_text(
+    draw: ImageDraw.ImageDraw,
+    text: str,
+    image_parameters: types.ImageParameters,
+    text_parameters: types.TextParameters,
+    font_size: int,
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+) -> tuple[ImageFont.FreeTypeFont | ImageFont.ImageFont, types.TextParameters, str]:
+    fitted_text_parameters = dataclasses.replace(
+        text_parameters,
+        font=dataclasses.replace(text_parameters.font, size=font_size),
+        rectangle=fit_text_rectangle(image_parameters, text_parameters, font),
+    )
+    fitted_text = fit_text(draw, text, fitted_text_parameters, font)
+    return (font, fitted_text_parameters, fitted_text)
+
+def _is_text_fitted(
+    draw: ImageDraw.ImageDraw,
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+    text_parameters: types.TextParameters,
+    text: str,
+) -> bool:
+    (text_box_left, text_box_top, text_box_right, text_box_bottom) \
+        = _get_text_box(draw, text, font)
+    rectangle = text_parameters.rectangle
+    # a word can be wider than the rectangle, since it's never broken
+    return text_box_right - text_box_left <= rectangle.right - rectangle.left \
+        and text_box_bottom - text_box_top <= rectangle.bottom - rectangle.top
+
+def _get_horizontal_bounds(
+    draw: ImageDraw.ImageDraw,
+    text: str,
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+) -> tuple[int, int]:
+    (text_box_left, _, text_box_right, _) = _get_text_box(draw, text, font)
+    return (text_box_left, text_box_right)
+
+def _get_text_box(
+    draw: ImageDraw.ImageDraw,
+    text: str,
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+) -> _TextBox:
+    # the font mode of the drawing affects the glyph hinting and so the box
+    key = (_get_font_key(font), getattr(draw, 'fontmode', None), text)
+    return text_box_cache.get(
+        key,
+        lambda: draw.multiline_textbbox((0, 0), text, font=font),
+    )
+
+def _get_font_key(
+    font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+) -> typing.Hashable:
+    font_path = getattr(font, 'path', None)
+    if isinstance(font, ImageFont.FreeTypeFont) \
+        and isinstance(font_path, (str, os.PathLike)):
+        return (os.fspath(font_path), font.size, font.index)
+
+    # fonts loaded not from a file can be distinguished only by identity
+    return font
+
+def _join_bounds(
+    bounds: tuple[int, int],
+    other_bounds: tuple[int, int] | None,
+) -> tuple[int, int]:
+    if other_bounds is None:
+        return bounds
+
+    return (min(bounds[0], other_bounds[0]), max(bounds[1], other_bounds[1]))
+
 def _get_text_position_on_axis(
     axis_start: int,
     axis_end: int,
@@ -1,12 +1,16 @@
 import unittest
 import unittest.mock
+import pathlib
 
+from PIL import Image
 from PIL import ImageDraw
 from PIL import ImageFont
 
 from . import text
 from . import types
 
+_RESOURCES_PATH = pathlib.Path(__file__).parent.parent / 'resources'
+
 class TestFitTextRectangle(unittest.TestCase):
   def setUp(self) -> None:
     self.font = unittest.mock.create_autospec(ImageFont.FreeTypeFont)
@@ -309,7 +313,7 @@ class TestFitText(unittest.TestCase):
     self.image_draw.multiline_textbbox.assert_has_calls([
       unittest.mock.call((0, 0), 'single line', self.font),
       unittest.mock.call((0, 0), 'single line with', self.font),
-      unittest.mock.call((0, 0), 'single line\nwith wrapping', self.font),
+      unittest.mock.call((0, 0), 'with wrapping', self.font),
     ])
 
   def test_single_line_with_wrapping_on_word_boundary(self) -> None:
@@ -327,7 +331,7 @@ class TestFitText(unittest.TestCase):
     self.image_draw.multiline_textbbox.assert_has_calls([
       unittest.mock.call((0, 0), 'single line', self.font),
       unittest.mock.call((0, 0), 'single line with', self.font),
-      unittest.mock.call((0, 0), 'single line\nwith wrapping', self.font),
+      unittest.mock.call((0, 0), 'with wrapping', self.font),
     ])
 
   def test_single_line_with_wrapping_and_extra_spaces(self) -> None:
@@ -345,7 +349,44 @@ class TestFitText(unittest.TestCase):
     self.image_draw.multiline_textbbox.assert_has_calls([
       unittest.mock.call((0, 0), 'single line', self.font),
       unittest.mock.call((0, 0), 'single line with', self.font),
-      unittest.mock.call((0, 0), 'single line\nwith wrapping', self.font),
+      unittest.mock.call((0, 0), 'with wrapping', self.font),
+    ])
+
+  def test_single_line_with_wrapping_of_single_word(self) -> None:
+    self.image_draw.multiline_textbbox.side_effect = [
+      (0, None, 110, None),
+      (0, None, 60, None),
+      (-5, None, 80, None),
+    ]
+
+    text_line = 'single line wrapping'
+    text_parameters = types.TextParameters(rectangle=types.Rectangle(left=50, right=150))
+    fitted_text = text.fit_text(self.image_draw, text_line, text_parameters, self.font)
+
+    self.assertEqual(fitted_text, 'single\nline wrapping')
+    self.image_draw.multiline_textbbox.assert_has_calls([
+      unittest.mock.call((0, 0), 'single line', self.font),
+      unittest.mock.call((0, 0), 'single', self.font),
+      unittest.mock.call((0, 0), 'line wrapping', self.font),
+    ])
+
+  def test_single_line_with_wrapping_after_too_long_word(self) -> None:
+    self.image_draw.multiline_textbbox.side_effect = [
+      (0, None, 120, None),
+      (0, None, 110, None),
+      (0, None, 30, None),
+    ]
+
+    text_line = 'single line with'
+    text_parameters = types.TextParameters(rectangle=types.Rectangle(left=50, right=150))
+    fitted_text = text.fit_text(self.image_draw, text_line, text_parameters, self.font)
+
+    # the bounding box of the whole text is still wider than the rectangle
+    self.assertEqual(fitted_text, 'single\nline\nwith')
+    self.image_draw.multiline_textbbox.assert_has_calls([
+      unittest.mock.call((0, 0), 'single line', self.font),
+      unittest.mock.call((0, 0), 'single', self.font),
+      unittest.mock.call((0, 0), 'line with', self.font),
     ])
 
   def test_multiple_lines_without_wrapping(self) -> None:
@@ -390,10 +431,10 @@ class TestFitText(unittest.TestCase):
     self.image_draw.multiline_textbbox.assert_has_calls([
       unittest.mock.call((0, 0), 'line #1:', self.font),
       unittest.mock.call((0, 0), 'line #1: multiple', self.font),
-      unittest.mock.call((0, 0), 'line #1:\nmultiple lines', self.font),
+      unittest.mock.call((0, 0), 'multiple lines', self.font),
       unittest.mock.call((0, 0), 'line #2:', self.font),
       unittest.mock.call((0, 0), 'line #2: with', self.font),
-      unittest.mock.call((0, 0), 'line #2:\nwith wrapping', self.font),
+      unittest.mock.call((0, 0), 'with wrapping', self.font),
     ])
 
   def test_multiple_lines_with_wrapping_on_word_boundary(self) -> None:
@@ -414,10 +455,10 @@ class TestFitText(unittest.TestCase):
     self.image_draw.multiline_textbbox.assert_has_calls([
       unittest.mock.call((0, 0), 'line #1:', self.font),
       unittest.mock.call((0, 0), 'line #1: multiple', self.font),
-      unittest.mock.call((0, 0), 'line #1:\nmultiple lines', self.font),
+      unittest.mock.call((0, 0), 'multiple lines', self.font),
       unittest.mock.call((0, 0), 'line #2:', self.font),
       unittest.mock.call((0, 0), 'line #2: with', self.font),
-      unittest.mock.call((0, 0), 'line #2:\nwith wrapping', self.font),
+      unittest.mock.call((0, 0), 'with wrapping', self.font),
     ])
 
   def test_multiple_lines_with_wrapping_and_extra_spaces(self) -> None:
@@ -438,12 +479,83 @@ class TestFitText(unittest.TestCase):
     self.image_draw.multiline_textbbox.assert_has_calls([
       unittest.mock.call((0, 0), 'line #1:', self.font),
       unittest.mock.call((0, 0), 'line #1: multiple', self.font),
-      unittest.mock.call((0, 0), 'line #1:\nmultiple lines', self.font),
+      unittest.mock.call((0, 0), 'multiple lines', self.font),
       unittest.mock.call((0, 0), 'line #2:', self.font),
       unittest.mock.call((0, 0), 'line #2: with', self.font),
-      unittest.mock.call((0, 0), 'line #2:\nwith wrapping', self.font),
+      unittest.mock.call((0, 0), 'with wrapping', self.font),
     ])
 
+class TestFitFontSize(unittest.TestCase):
+  def setUp(self) -> None:
+    self.image = Image.new('RGB', (640, 480))
+    self.image_draw = ImageDraw.Draw(self.image)
+    self.font_file = _RESOURCES_PATH / 'font' / 'Kalam-Regular.ttf'
+    self.font_sizes: list[int] = []
+
+  def get_font(self, font_size: int) -> ImageFont.FreeTypeFont:
+    self.font_sizes.append(font_size)
+    return ImageFont.truetype(self.font_file, font_size)
+
+  def fit_font_size(
+    self,
+    note: str,
+    size_auto: tuple[int, int],
+  ) -> tuple[ImageFont.FreeTypeFont | ImageFont.ImageFont, types.TextParameters, str]:
+    return text.fit_font_size(
+      self.image_draw,
+      note,
+      types.ImageParameters(width=640, height=480),
+      types.TextParameters(
+        font=types.FontParameters(file=self.font_file, size_auto=size_auto),
+        rectangle=types.Rectangle(left=40, top=40, right=600, bottom=440),
+      ),
+      self.get_font,
+    )
+
+  def test_short_text(self) -> None:
+    (font, text_parameters, fitted_text) = \
+      self.fit_font_size('short text', (10, 100))
+
+    self.assertEqual(text_parameters.font.size, 100)
+    self.assertEqual(getattr(font, 'size'), 100)
+    self.assertEqual(fitted_text, 'short text')
+
+  def test_long_text(self) -> None:
+    note = ' '.join(['long text'] * 50)
+
+    (font, text_parameters, fitted_text) = self.fit_font_size(note, (10, 100))
+
+    # the fitted text box is inside the rectangle,
+    # but the next size doesn't fit it
+    (left, top, right, bottom) = \
+      self.image_draw.multiline_textbbox((0, 0), fitted_text, font=font)
+    self.assertLessEqual(right - left, 560)
+    self.assertLessEqual(bottom - top, 400)
+    self.assertLess(text_parameters.font.size, 100)
+    self.assertGreater(text_parameters.font.size, 10)
+
+    (_, _, other_fitted_text) = self.fit_font_size(
+      note,
+      (text_parameters.font.size + 1, text_parameters.font.size + 1),
+    )
+    (left, top, right, bottom) = self.image_draw.multiline_textbbox(
+      (0, 0),
+      other_fitted_text,
+      font=self.get_font(text_parameters.font.size + 1),
+    )
+    self.assertTrue(right - left > 560 or bottom - top > 400)
+
+  def test_logarithmic_number_of_layouts(self) -> None:
+    self.fit_font_size(' '.join(['long text'] * 50), (1, 128))
+
+    self.assertLessEqual(len(self.font_sizes), 8)
+
+  def test_overflowing_text(self) -> None:
+    (_, text_parameters, _) = \
+      self.fit_font_size(' '.join(['long text'] * 500), (50, 60))
+
+    self.assertEqual(text_parameters.font.size, 50)
+
 class TestGetTextPosition(unittest.TestCase):
   def setUp(self) -> None:
     self.image_draw = unittest.mock.create_autospec(ImageDraw.ImageDraw)
@@ -602,6 +714,49 @@ class TestGetTextPosition(unittest.TestCase):
       unittest.mock.call((0, 0), 'text', self.font),
     ])
 
+class TestTextBoxCache(unittest.TestCase):
+  def setUp(self) -> None:
+    self.image_draw = unittest.mock.create_autospec(ImageDraw.ImageDraw)
+    self.font = ImageFont.load_default()
+
+  def test_repeated_text(self) -> None:
+    self.image_draw.multiline_textbbox.side_effect = [(0, 0, 150, 75)]
+
+    text_parameters = types.TextParameters(
+      rectangle=types.Rectangle(left=40, top=60, right=240, bottom=160),
+    )
+    first_position = \
+      text.get_text_position(self.image_draw, 'text', text_parameters, self.font)
+    second_position = \
+      text.get_text_position(self.image_draw, 'text', text_parameters, self.font)
+
+    self.assertEqual(first_position, second_position)
+    self.assertEqual(self.image_draw.multiline_textbbox.call_count, 1)
+
+  def test_same_font_file(self) -> None:
+    self.image_draw.multiline_textbbox.side_effect = [(0, 0, 150, 75)]
+
+    font_file = _RESOURCES_PATH / 'font' / 'Kalam-Regular.ttf'
+    text_parameters = types.TextParameters(
+      rectangle=types.Rectangle(left=40, top=60, right=240, bottom=160),
+    )
+    text.text_box_cache.clear()
+    text.get_text_position(
+      self.image_draw,
+      'text',
+      text_parameters,
+      ImageFont.truetype(font_file, 25),
+    )
+    text.get_text_position(
+      self.image_draw,
+      'text',
+      text_parameters,
+      ImageFont.truetype(font_file, 25),
+    )
+
+    self.assertEqual(self.image_draw.multiline_textbbox.call_count, 1)
+    self.assertEqual((text.text_box_cache.hits, text.text_box_cache.misses), (1, 1))
+
 class TestGetWatermarkPosition(unittest.TestCase):
   def setUp(self) -> None:
     self.image_draw = unittest.mock.create_autospec(ImageDraw.ImageDraw)
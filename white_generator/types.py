@@ -36,6 +36,7 @@ DEFAULT_IMAGE_WIDTH = 640
 DEFAULT_IMAGE_HEIGHT = 480
 DEFAULT_IMAGE_BACKGROUND_COLOR = Color.parse('rgb(255, 255, 255)')
 DEFAULT_IMAGE_RESIZING_FILTER = Image.Resampling.LANCZOS
+DEFAULT_IMAGE_BACKGROUND_CACHE_SIZE = 16
 
 DEFAULT_FONT_SIZE = 25
 DEFAULT_FONT_COLOR = Color.parse('rgb(0, 0, 0)')
@@ -48,12 +49,22 @@ DEFAULT_RECTANGLE_BOTTOM = -1
 DEFAULT_WATERMARK_SIZE = 12
 DEFAULT_WATERMARK_COLOR = Color.parse('rgb(128, 128, 128)')
 
+# TODO: replace with `enum.StrEnum` after upgrading to Python 3.11
+class BackgroundChoice(str, enum.Enum):
+    HASH = 'hash'
+    RANDOM = 'random'
+
+DEFAULT_IMAGE_BACKGROUND_CHOICE = BackgroundChoice.HASH
+
 @dataclasses.dataclass
 class ImageParameters:
     width: int = DEFAULT_IMAGE_WIDTH
     height: int = DEFAULT_IMAGE_HEIGHT
     background_color: Color = DEFAULT_IMAGE_BACKGROUND_COLOR
     background_image: pathlib.Path | None = None
+    background_directory: pathlib.Path | None = None
+    background_choice: BackgroundChoice = DEFAULT_IMAGE_BACKGROUND_CHOICE
+    background_cache_size: int = DEFAULT_IMAGE_BACKGROUND_CACHE_SIZE
     resizing_filter: Image.Resampling = DEFAULT_IMAGE_RESIZING_FILTER
     no_resizing: bool = False
 
@@ -61,10 +72,31 @@ class ImageParameters:
     def size(self) -> tuple[int, int]:
         return (self.width, self.height)
 
+# TODO: replace with `enum.StrEnum` after upgrading to Python 3.11
+class FillType(str, enum.Enum):
+    SOLID = 'solid'
+    HORIZONTAL = 'horizontal'
+    VERTICAL = 'vertical'
+    RADIAL = 'radial'
+    CHECKERBOARD = 'checkerboard'
+    STRIPES = 'stripes'
+
+DEFAULT_FILL_TYPE = FillType.SOLID
+DEFAULT_FILL_SECOND_COLOR = Color.parse('rgb(192, 192, 192)')
+DEFAULT_FILL_PATTERN_SIZE = 32
+
+@dataclasses.dataclass
+class FillParameters:
+    type: FillType = DEFAULT_FILL_TYPE
+    second_color: Color = DEFAULT_FILL_SECOND_COLOR
+    pattern_size: int = DEFAULT_FILL_PATTERN_SIZE
+
 @dataclasses.dataclass
 class FontParameters:
     file: pathlib.Path | None = None
     size: int = DEFAULT_FONT_SIZE
+    # the minimal and maximal sizes for the automatic size selection
+    size_auto: tuple[int, int] | None = None
     color: Color = DEFAULT_FONT_COLOR
 
 @dataclasses.dataclass
@@ -99,5 +131,38 @@ class TextParameters:
 @dataclasses.dataclass
 class WatermarkParameters:
     text: str | None = None
+    image: pathlib.Path | None = None
     size: int = DEFAULT_WATERMARK_SIZE
     color: Color = DEFAULT_WATERMARK_COLOR
+
+# TODO: replace with `enum.StrEnum` after upgrading to Python 3.11
+class ImageFormat(str, enum.Enum):
+    PNG = 'png'
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+    AVIF = 'avif'
+
+    @property
+    def extension(self) -> str:
+        return 'jpg' if self == ImageFormat.JPEG else self.value
+
+    @property
+    def is_supported(self) -> bool:
+        Image.init()
+        return self.value.upper() in Image.SAVE
+
+DEFAULT_ENCODING_FORMAT = ImageFormat.PNG
+
+@dataclasses.dataclass
+class EncodingParameters:
+    format: ImageFormat = DEFAULT_ENCODING_FORMAT
+    compress_level: int | None = None
+    quality: int | None = None
+    optimize: bool = False
+    quantize: bool = False
+
+@dataclasses.dataclass
+class AtlasParameters:
+    # if the value is zero, the notes are saved in separate images
+    note_count: int = 0
+    columns: int | None = None
@@ -0,0 +1,103 @@
+from __future__ import annotations
+import os
+import queue
+import pathlib
+import threading
+import typing
+from types import TracebackType
+
+import termcolor
+
+from . import logger
+from . import profiling
+
+_WrittenCallback: typing.TypeAlias = typing.Callable[[], None]
+_WritingTask: typing.TypeAlias = \
+    tuple[pathlib.Path, bytes, _WrittenCallback | None]
+
+class ImageWriter:
+    def __init__(self, thread_count: int, queue_size: int) -> None:
+        # the failed images are counted by the writer threads
+        self.failure_count = 0
+        self._failure_lock = threading.Lock()
+
+        # the bounded queue blocks the rendering when the writing lags behind
+        self._tasks: queue.Queue[_WritingTask | None] = queue.Queue(queue_size)
+        self._threads = [
+            threading.Thread(target=self._write_images, daemon=True)
+            for _ in range(thread_count)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> ImageWriter:
+        return self
+
+    def __exit__(
+        self,
+        exception_type: type[BaseException] | None,
+        exception: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        # the queued images are written even on the KeyboardInterrupt exception
+        self.close()
+
+    def write(
+        self,
+        image_file: pathlib.Path,
+        image_data: bytes,
+        on_written: _WrittenCallback | None = None,
+    ) -> None:
+        # the callback is called only after the successful writing,
+        # and in a writer thread if there are any
+        if not self._threads:
+            write_image_file(image_file, image_data)
+            if on_written is not None:
+                on_written()
+
+            return
+
+        self._tasks.put((image_file, image_data, on_written))
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+
+    def _write_images(self) -> None:
+        while (task := self._tasks.get()) is not None:
+            (image_file, image_data, on_written) = task
+            try:
+                write_image_file(image_file, image_data)
+            except Exception as exception:
+                logger.get_logger().error(
+                    'unable to write the %s image: %s',
+                    termcolor.colored(str(image_file), 'blue'),
+                    exception,
+                )
+                with self._failure_lock:
+                    self.failure_count += 1
+
+                continue
+
+            if on_written is not None:
+                on_written()
+
+def write_image_file(image_file: pathlib.Path, image_data: bytes) -> None:
+    # write via a temporary file, so an interrupted run doesn't leave
+    # a broken image that would be skipped by the `--skip-existing` mode;
+    # its name is unique for each process and thread, so the writers
+    # of the same image don't clash on it
+    with profiling.profiler.measure('saving'):
+        temporary_image_file = image_file.with_name(
+            f'{image_file.name}.{os.getpid()}.{threading.get_ident()}.tmp',
+        )
+        try:
+            temporary_image_file.write_bytes(image_data)
+            temporary_image_file.replace(image_file)
+        except BaseException:
+            temporary_image_file.unlink(missing_ok=True)
+            raise
@@ -0,0 +1,59 @@
+import unittest
+import tempfile
+import pathlib
+
+from . import writing
+
+class TestImageWriter(unittest.TestCase):
+  def setUp(self) -> None:
+    self._tmpDir = tempfile.TemporaryDirectory(prefix='white-generator-')
+    self.output_path = pathlib.Path(self._tmpDir.name)
+
+  def tearDown(self) -> None:
+    self._tmpDir.cleanup()
+
+  def test_synchronous_writing(self) -> None:
+    with writing.ImageWriter(0, 1) as image_writer:
+      image_writer.write(self.output_path / 'image.png', b'image data')
+      self.assertEqual((self.output_path / 'image.png').read_bytes(), b'image data')
+
+  def test_background_writing(self) -> None:
+    with writing.ImageWriter(2, 1) as image_writer:
+      for index in range(10):
+        image_writer.write(self.output_path / f'image_{index}.png', b'image data')
+
+    for index in range(10):
+      self.assertEqual(
+        (self.output_path / f'image_{index}.png').read_bytes(),
+        b'image data',
+      )
+    self.assertEqual(list(self.output_path.glob('*.tmp')), [])
+
+  def test_concurrent_writing_of_same_image(self) -> None:
+    image_data = [bytes([index]) * 1024 for index in range(50)]
+    with self.assertNoLogs('white_generator', level='ERROR'):
+      with writing.ImageWriter(4, 8) as image_writer:
+        for data in image_data:
+          image_writer.write(self.output_path / 'image.png', data)
+
+    self.assertIn((self.output_path / 'image.png').read_bytes(), image_data)
+    self.assertEqual(list(self.output_path.glob('*.tmp')), [])
+
+  def test_background_writing_with_error(self) -> None:
+    written_images = []
+    with self.assertLogs('white_generator', level='ERROR'):
+      with writing.ImageWriter(1, 1) as image_writer:
+        image_writer.write(
+          self.output_path / 'unknown' / 'image.png',
+          b'image data',
+          lambda: written_images.append('unknown/image.png'),
+        )
+        image_writer.write(
+          self.output_path / 'image.png',
+          b'image data',
+          lambda: written_images.append('image.png'),
+        )
+
+    self.assertEqual((self.output_path / 'image.png').read_bytes(), b'image data')
+    self.assertEqual(written_images, ['image.png'])
+    self.assertEqual(image_writer.failure_count, 1)